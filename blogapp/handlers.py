@@ -0,0 +1,184 @@
+"""
+Обработчики логов, которые не пишут на потоке запроса.
+
+BackgroundHandler - QueueHandler со своим QueueListener: в вызывающем
+потоке у записи только фиксируется текст сообщения, а форматирование
+и запись в файл или поток вывода делает фоновый поток. Вызов logger.info()
+из view или из цикла событий ASGI стоит микросекунды и не ждёт диска.
+
+Фоновый поток забирает записи пачками (batch_size, flush_interval), а
+RotatingBatchFileHandler пишет пачку одним write() и flush() и ротирует
+файл по размеру и по времени. JsonFormatter даёт одну строку JSON на запись.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.utils.module_loading import import_string
+
+
+class JsonFormatter(logging.Formatter):
+    """Строка JSON: время, уровень, логгер, сообщение и поля из extra={'data': {...}}"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'data', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingBatchFileHandler(RotatingFileHandler):
+    """
+    Файл с ротацией по размеру (maxBytes) и по времени (interval, секунды) -
+    что наступит раньше. emit_batch() пишет пачку записей за один вызов.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, interval=0, encoding='utf-8', delay=True):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=delay)
+        self.interval = interval
+        started = os.stat(self.baseFilename).st_mtime if os.path.exists(self.baseFilename) else time.time()
+        self.rollover_at = self._next_rollover(started)
+
+    def _next_rollover(self, now):
+        return now + self.interval if self.interval else float('inf')
+
+    def shouldRollover(self, record):
+        return time.time() >= self.rollover_at or super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+    def emit_batch(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+
+        data = ''.join(lines)
+        # maxBytes - байты файла, а кириллица в UTF-8 занимает по два
+        size = len(data.encode(self.encoding or 'utf-8'))
+        with self.lock:
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.seek(0, 2)
+                size_over = self.maxBytes > 0 and self.stream.tell() and self.stream.tell() + size >= self.maxBytes
+                if size_over or time.time() >= self.rollover_at:
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class BatchQueueListener(QueueListener):
+    """
+    Забирает из очереди до batch_size записей, ожидая добора не дольше
+    flush_interval секунд после первой, и отдаёт их обработчику одной пачкой.
+    """
+
+    def __init__(self, queue, handler, batch_size=1, flush_interval=0.0):
+        super().__init__(queue, handler)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def handle_batch(self, records):
+        handler = self.handlers[0]
+        if hasattr(handler, 'emit_batch'):
+            handler.emit_batch([record for record in records if record.levelno >= handler.level])
+        else:
+            for record in records:
+                self.handle(record)
+
+    def _collect(self, batch):
+        """Добирает пачку; True, если в очереди встретился сигнал остановки"""
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                record = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                return False
+            if record is self._sentinel:
+                return True
+            batch.append(record)
+        return False
+
+    def _monitor(self):
+        while True:
+            record = self.dequeue(True)
+            if record is self._sentinel:
+                break
+            batch = [record]
+            stopping = self._collect(batch)
+            self.handle_batch(batch)
+            if stopping:
+                break
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    'file': {
+        '()': 'blogapp.handlers.BackgroundHandler',
+        'target': 'blogapp.handlers.RotatingBatchFileHandler',
+        'filename': LOGS_DIR / 'django.log',
+        'batch_size': 256,
+        'flush_interval': 0.5,
+        'formatter': 'simple',
+    }
+
+    Остальные параметры передаются целевому обработчику target, ему же
+    достаётся formatter. Фабрика '()' вместо 'class', потому что dictConfig
+    в Python 3.12+ ждёт от подклассов QueueHandler ключ handlers.
+    """
+
+    def __init__(self, target='logging.StreamHandler', batch_size=1, flush_interval=0.0, **target_kwargs):
+        super().__init__(queue.SimpleQueue())
+        handler_class = import_string(target) if isinstance(target, str) else target
+        self.target = handler_class(**target_kwargs)
+        self.listener = BatchQueueListener(self.queue, self.target, batch_size, flush_interval)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Фиксирует текст сообщения и трейсбек; остальное форматирование - в фоновом потоке"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def stop(self):
+        """Дописывает очередь и останавливает фоновый поток"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        self.target.close()
+        super().close()
@@ -1,13 +1,81 @@
 import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from myfirstproject.instrumentation import current_metrics, install_query_timers, track
+
+logger = logging.getLogger('blogapp.requests')
+
+
+@contextmanager
+def request_metrics():
+    """
+    Показатели запроса от InstrumentationMiddleware; без неё - свои.
+    Контекст копируется в потоки sync_to_async, поэтому под ASGI
+    запросы из view тоже видны.
+    """
+    metrics = current_metrics()
+    if metrics is not None:
+        yield metrics
+        return
+    with track() as metrics:
+        yield metrics
+
+
+def response_size(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if response.streaming:
+        return None
+    return len(response.content)
 
-logger = logging.getLogger('blogapp')
 
 class LoggingMiddleware:
+    """
+    Одна строка JSON на запрос: метод, путь, статус, длительность,
+    число запросов к БД и размер ответа.
+
+    Работает в синхронном и асинхронном стеке; запись уходит в очередь
+    фонового обработчика (blogapp.handlers.BackgroundHandler), поэтому
+    логирование не ждёт файла.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        install_query_timers()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        logger.info(f"Request: {request.method} {request.path}")
-        response = self.get_response(request)
-        logger.info(f"Response: {response.status_code}")
-        return response
\ No newline at end of file
+        if self.async_mode:
+            return self.__acall__(request)
+        with request_metrics() as metrics:
+            queries = metrics.db_count
+            started = time.perf_counter()
+            response = self.get_response(request)
+        self.log(request, response, started, metrics.db_count - queries)
+        return response
+
+    async def __acall__(self, request):
+        with request_metrics() as metrics:
+            queries = metrics.db_count
+            started = time.perf_counter()
+            response = await self.get_response(request)
+        self.log(request, response, started, metrics.db_count - queries)
+        return response
+
+    def log(self, request, response, started, queries):
+        duration = time.perf_counter() - started
+        logger.info("%s %s %s", request.method, request.path, response.status_code, extra={'data': {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'queries': queries,
+            'bytes': response_size(response),
+        }})
@@ -1,3 +1,119 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .handlers import BackgroundHandler, JsonFormatter, RotatingBatchFileHandler
+
+
+class BatchCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def emit_batch(self, records):
+        self.batches.append([self.format(record) for record in records])
+
+
+class BackgroundHandlerTestCase(SimpleTestCase):
+    """Тесты записи логов в фоновом потоке"""
+
+    def make_logger(self, handler):
+        logger = logging.getLogger('blogapp.tests.background')
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(handler.close)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_records_reach_target(self):
+        handler = BackgroundHandler(target='logging.handlers.BufferingHandler', capacity=100)
+        logger = self.make_logger(handler)
+
+        logger.warning("Response: %s", 200)
+        handler.stop()
+
+        self.assertEqual([record.getMessage() for record in handler.target.buffer], ['Response: 200'])
+
+    def test_records_are_batched(self):
+        handler = BackgroundHandler(target=BatchCollector, batch_size=100, flush_interval=0.5)
+        handler.setFormatter(JsonFormatter())
+        logger = self.make_logger(handler)
+
+        for index in range(5):
+            logger.warning("line %s", index, extra={'data': {'index': index}})
+        handler.stop()
+
+        self.assertEqual(len(handler.target.batches), 1)
+        lines = [json.loads(line) for line in handler.target.batches[0]]
+        self.assertEqual([line['index'] for line in lines], list(range(5)))
+        self.assertEqual(lines[0]['message'], 'line 0')
+
+
+class RotatingBatchFileHandlerTestCase(SimpleTestCase):
+    """Тесты ротации файла по размеру и времени"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'requests.log')
+
+    def records(self, count):
+        return [logging.makeLogRecord({'msg': 'x' * 40}) for _ in range(count)]
+
+    def test_rotation_by_size(self):
+        handler = RotatingBatchFileHandler(self.path, maxBytes=100, backupCount=2)
+        self.addCleanup(handler.close)
+        for _ in range(3):
+            handler.emit_batch(self.records(2))
+
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        with open(self.path) as file:
+            self.assertEqual(len(file.readlines()), 2)
+
+    def test_rotation_counts_bytes(self):
+        """Кириллица в UTF-8 - два байта на символ, размер считается в байтах"""
+        handler = RotatingBatchFileHandler(self.path, maxBytes=100, backupCount=1)
+        self.addCleanup(handler.close)
+        for _ in range(2):
+            handler.emit_batch([logging.makeLogRecord({'msg': 'я' * 30})])
+
+        self.assertTrue(os.path.exists(self.path + '.1'))
+
+    def test_rotation_by_time(self):
+        handler = RotatingBatchFileHandler(self.path, backupCount=1, interval=3600)
+        self.addCleanup(handler.close)
+        handler.emit_batch(self.records(1))
+        handler.rollover_at -= 7200
+        handler.emit_batch(self.records(1))
+
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertGreater(handler.rollover_at, time.time())
+
+
+class LoggingMiddlewareTestCase(TestCase):
+    """Тесты структурированного лога запросов"""
+    fixtures = ['users-fixtures.json', 'products-fixtures.json']
+
+    def test_request_line(self):
+        with self.assertLogs('blogapp.requests', 'INFO') as logs:
+            response = self.client.get(reverse('shopapp:products_list'))
+
+        data = logs.records[-1].data
+        self.assertEqual(data['method'], 'GET')
+        self.assertEqual(data['status'], 200)
+        self.assertEqual(data['bytes'], len(response.content))
+        self.assertGreater(data['queries'], 0)
+        self.assertGreaterEqual(data['duration_ms'], 0)
+
+    def test_files_are_not_written_under_tests(self):
+        for name in ('blogapp.requests', 'django'):
+            handlers = logging.getLogger(name).handlers
+            self.assertTrue(handlers)
+            self.assertTrue(all(isinstance(handler, logging.NullHandler) for handler in handlers))
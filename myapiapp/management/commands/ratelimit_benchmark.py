@@ -0,0 +1,58 @@
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from myapiapp.ratelimit import Rate, SlidingWindowLimiter
+
+
+def legacy_hit(cache, key, limit, window):
+    """Прежний алгоритм ThrottlingMiddleware: список отметок времени на ключ"""
+    history = cache.get(key, [])
+    now = time.time()
+    history = [timestamp for timestamp in history if now - timestamp < window]
+    if len(history) >= limit:
+        return False
+    history.append(now)
+    cache.set(key, history, window)
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк ограничителя частоты: цена проверки при разных лимитах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Проверок на каждый лимит')
+        parser.add_argument('--limits', default='10,1000,10000', help='Лимиты через запятую')
+        parser.add_argument(
+            '--cache',
+            default=None,
+            help='Алиас кеша из CACHES; по умолчанию отдельный LocMemCache, чтобы не трогать рабочий кеш',
+        )
+
+    def get_cache(self, alias):
+        if alias:
+            return caches[alias]
+        return LocMemCache('ratelimit-benchmark', {'OPTIONS': {'MAX_ENTRIES': 100000}})
+
+    def measure(self, func, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            func()
+        return (time.perf_counter() - started) / count * 1e6
+
+    def handle(self, *args, **options):
+        cache = self.get_cache(options['cache'])
+        count = options['requests']
+        limiter = SlidingWindowLimiter(cache=cache, prefix='bench')
+
+        self.stdout.write(f"{'limit':>8} {'sliding window, µs':>20} {'timestamp list, µs':>20}")
+        for limit in (int(value) for value in options['limits'].split(',')):
+            rates = [Rate(limit, 3600)]
+            cache.clear()
+            sliding = self.measure(lambda: limiter.hit(f'bench-{limit}', rates), count)
+            cache.clear()
+            legacy = self.measure(lambda: legacy_hit(cache, f'legacy-{limit}', limit, 3600), count)
+            self.stdout.write(f'{limit:>8} {sliding:>20.1f} {legacy:>20.1f}')
+        cache.clear()
@@ -1,54 +1,90 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
-from django.core.cache import cache
-import time
+
+from .ratelimit import SlidingWindowLimiter, compile_exempt_paths, load_rules
 
 
 class ThrottlingMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-        self.requests_limit = 10
-        self.time_window = 60
+    """
+    Ограничение частоты запросов по политикам RATELIMIT_RULES.
 
-    def __call__(self, request):
-        ip_address = self.get_client_ip(request)
+    Политика выбирается по пространству имён найденного view, поэтому
+    проверка идёт в process_view, после разрешения URL. Пути из
+    RATELIMIT_EXEMPT_PATHS (статика, медиа, панель отладки) и view без
+    подходящей политики не обращаются к кешу вовсе. Состояние - счётчики
+    скользящего окна (см. myapiapp.ratelimit).
 
-        cache_key = f'throttle_{ip_address}'
+    Работает и в синхронном, и в асинхронном стеке: под ASGI и __call__,
+    и process_view - корутины, и Django не переключает запрос в поток.
+    """
+    sync_capable = True
+    async_capable = True
 
-        request_history = cache.get(cache_key, [])
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = load_rules()
+        self.exempt = compile_exempt_paths()
+        self.limiter = SlidingWindowLimiter()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django адаптирует process_view по типу метода экземпляра
+            self.process_view = self.aprocess_view
 
-        now = time.time()
+    def get_rule(self, view_name):
+        for rule in self.rules:
+            if rule.matches(view_name):
+                return rule
+        return None
 
-        request_history = [
-            timestamp for timestamp in request_history
-            if now - timestamp < self.time_window
-        ]
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.mark_exempt(request)
+        return self.add_headers(request, self.get_response(request))
 
-        if len(request_history) >= self.requests_limit:
-            oldest_request = min(request_history)
-            retry_after = int(self.time_window - (now - oldest_request))
+    async def __acall__(self, request):
+        self.mark_exempt(request)
+        return self.add_headers(request, await self.get_response(request))
 
-            return JsonResponse({
-                'error': 'Превышен лимит запросов',
-                'message': f'Вы превысили лимит в {self.requests_limit} запросов за {self.time_window} секунд.',
-                'retry_after': f'{retry_after} секунд'
-            }, status=429)
+    def mark_exempt(self, request):
+        if self.exempt is not None and self.exempt.match(request.path_info):
+            request._throttling_exempt = True
 
-        request_history.append(now)
+    def add_headers(self, request, response):
+        decision = getattr(request, '_throttling_decision', None)
+        if decision is not None:
+            response['X-RateLimit-Limit'] = str(decision.limit)
+            response['X-RateLimit-Remaining'] = str(decision.remaining)
+            response['X-RateLimit-Reset'] = str(decision.reset)
+        return response
 
-        cache.set(cache_key, request_history, self.time_window)
+    def select_rule(self, request):
+        if getattr(request, '_throttling_exempt', False):
+            return None
+        return self.get_rule(request.resolver_match.view_name)
 
-        response = self.get_response(request)
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rule = self.select_rule(request)
+        if rule is None:
+            return None
+        return self.respond(request, self.limiter.hit(rule.get_key(request), rule.rates))
 
-        response['X-RateLimit-Limit'] = str(self.requests_limit)
-        response['X-RateLimit-Remaining'] = str(self.requests_limit - len(request_history))
-        response['X-RateLimit-Reset'] = str(int(now + self.time_window))
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        rule = self.select_rule(request)
+        if rule is None:
+            return None
+        return self.respond(request, await self.limiter.ahit(await rule.aget_key(request), rule.rates))
 
-        return response
+    def respond(self, request, decision):
+        request._throttling_decision = decision
 
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
+        if not decision.allowed:
+            response = JsonResponse({
+                'error': 'Превышен лимит запросов',
+                'message': f'Вы превысили лимит в {decision.limit} запросов за {decision.window} секунд.',
+                'retry_after': f'{decision.retry_after} секунд'
+            }, status=429)
+            response['Retry-After'] = str(decision.retry_after)
+            return response
+        return None
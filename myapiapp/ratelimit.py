@@ -0,0 +1,222 @@
+"""
+Ограничение частоты запросов скользящим окном со счётчиками.
+
+На каждую пару (ключ, лимит) хранится два целых числа: счётчик текущего
+окна и счётчик предыдущего. Оценка числа запросов за последние window
+секунд - previous * (доля предыдущего окна, ещё попадающая в интервал)
++ current. Счётчик увеличивается атомарным cache.incr(), поэтому
+параллельные запросы не теряют обновления, а цена проверки не зависит
+от лимита.
+
+Правило может задавать несколько лимитов сразу, например "20/s" для
+всплесков и "600/m" для устойчивой нагрузки: запрос проходит, только если
+его пропускают все.
+"""
+import math
+import re
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+Rate = namedtuple('Rate', 'limit window')
+Decision = namedtuple('Decision', 'allowed limit window remaining reset retry_after')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+
+DEFAULT_RULES = [
+    {'name': 'default', 'match': ['*'], 'key': 'ip', 'rates': ['10/m']},
+]
+
+DEFAULT_EXEMPT_PATHS = [
+    r'^/(static|media|__debug__)/',
+    r'^/favicon\.ico$',
+]
+
+
+def parse_rate(rate):
+    """'10/m', '100/5m', '20/s' -> Rate(limit, window в секундах)"""
+    if isinstance(rate, Rate):
+        return rate
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}, expected e.g. '10/m' or '100/5m'")
+    limit, multiplier, period = match.groups()
+    return Rate(int(limit), int(multiplier or 1) * PERIODS[period])
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def ip_key(request):
+    return f'ip:{get_client_ip(request)}'
+
+
+def user_key(request):
+    """Пользователь, а для анонимов - IP"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return ip_key(request)
+
+
+KEY_FUNCTIONS = {
+    'ip': ip_key,
+    'user': user_key,
+}
+
+
+class Rule:
+    """
+    Политика: к каким view она применяется, как выбрать ключ и лимиты.
+
+    match - пространства имён URL или имена view: "shopapp:api" подходит
+    ко всем view в shopapp:api, "myapiapp:upload" - к одному view,
+    "*" - к любому найденному view.
+    """
+
+    def __init__(self, rates, match=('*',), key='ip', name=None):
+        self.match = tuple(match)
+        self.key_func = KEY_FUNCTIONS[key] if isinstance(key, str) else key
+        self.rates = [parse_rate(rate) for rate in rates]
+        self.name = name or ','.join(self.match)
+
+    def matches(self, view_name):
+        for pattern in self.match:
+            if pattern == '*' or view_name == pattern or view_name.startswith(pattern + ':'):
+                return True
+        return False
+
+    def get_key(self, request):
+        return f'{self.name}:{self.key_func(request)}'
+
+    async def aget_key(self, request):
+        """Под ASGI пользователь загружается через request.auser(): ленивый request.user синхронный"""
+        if self.key_func is user_key and hasattr(request, 'auser'):
+            request.user = await request.auser()
+        return self.get_key(request)
+
+
+def load_rules(config=None):
+    if config is None:
+        config = getattr(settings, 'RATELIMIT_RULES', DEFAULT_RULES)
+    return [Rule(**rule) for rule in config]
+
+
+def compile_exempt_paths(patterns=None):
+    """Одно регулярное выражение на все исключения; None, если исключений нет"""
+    if patterns is None:
+        patterns = getattr(settings, 'RATELIMIT_EXEMPT_PATHS', DEFAULT_EXEMPT_PATHS)
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+class SlidingWindowLimiter:
+    """Счётчики скользящего окна поверх кеша Django; O(1) на запрос"""
+
+    def __init__(self, cache_alias='default', prefix='rl', cache=None):
+        self.cache_alias = cache_alias
+        self.prefix = prefix
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else caches[self.cache_alias]
+
+    def _keys(self, key, rate, now):
+        window_index = int(now // rate.window)
+        base = f'{self.prefix}:{key}:{rate.window}'
+        return f'{base}:{window_index}', f'{base}:{window_index - 1}'
+
+    def _incr(self, cache_key, rate, delta):
+        """incr() атомарен в бэкендах кеша; отсутствующий счётчик создаётся через add()"""
+        try:
+            return self.cache.incr(cache_key, delta)
+        except ValueError:
+            if self.cache.add(cache_key, delta, rate.window * 2):
+                return delta
+            return self.cache.incr(cache_key, delta)
+
+    def _decide(self, rate, current, previous, now):
+        elapsed = (now % rate.window) / rate.window
+        estimate = previous * (1 - elapsed) + current
+        reset = (int(now // rate.window) + 1) * rate.window
+        allowed = estimate <= rate.limit
+
+        if allowed:
+            retry_after = 0
+        elif current > rate.limit or not previous:
+            retry_after = reset - now
+        else:
+            # Когда вклад предыдущего окна упадёт настолько, что запрос пройдёт
+            needed = 1 - (rate.limit - current) / previous
+            retry_after = max(0, (needed - elapsed) * rate.window)
+
+        return Decision(
+            allowed=allowed,
+            limit=rate.limit,
+            window=rate.window,
+            remaining=max(0, math.floor(rate.limit - estimate)),
+            reset=int(reset),
+            retry_after=math.ceil(retry_after),
+        )
+
+    def _finish(self, rates, keys, currents, previous, now):
+        decisions = [
+            self._decide(rate, current, previous.get(previous_key, 0), now)
+            for rate, current, (_, previous_key) in zip(rates, currents, keys)
+        ]
+        allowed = all(decision.allowed for decision in decisions)
+        return min(decisions, key=lambda decision: (decision.allowed, decision.remaining)), allowed
+
+    def hit(self, key, rates, cost=1, now=None):
+        """
+        Учитывает запрос во всех лимитах и возвращает самое строгое решение.
+
+        Отклонённый запрос не засчитывается, иначе клиент, который продолжает
+        слать запросы, не выйдет из-под ограничения никогда.
+        """
+        now = time.time() if now is None else now
+        keys = [self._keys(key, rate, now) for rate in rates]
+        currents = [self._incr(current_key, rate, cost) for rate, (current_key, _) in zip(rates, keys)]
+        previous = self.cache.get_many([previous_key for _, previous_key in keys])
+
+        decision, allowed = self._finish(rates, keys, currents, previous, now)
+        if not allowed:
+            for current_key, _ in keys:
+                try:
+                    self.cache.decr(current_key, cost)
+                except ValueError:
+                    pass
+        return decision
+
+    async def _aincr(self, cache_key, rate, delta):
+        try:
+            return await self.cache.aincr(cache_key, delta)
+        except ValueError:
+            if await self.cache.aadd(cache_key, delta, rate.window * 2):
+                return delta
+            return await self.cache.aincr(cache_key, delta)
+
+    async def ahit(self, key, rates, cost=1, now=None):
+        """То же, что hit(), через асинхронный API кеша"""
+        now = time.time() if now is None else now
+        keys = [self._keys(key, rate, now) for rate in rates]
+        currents = [await self._aincr(current_key, rate, cost) for rate, (current_key, _) in zip(rates, keys)]
+        previous = await self.cache.aget_many([previous_key for _, previous_key in keys])
+
+        decision, allowed = self._finish(rates, keys, currents, previous, now)
+        if not allowed:
+            for current_key, _ in keys:
+                try:
+                    await self.cache.adecr(current_key, cost)
+                except ValueError:
+                    pass
+        return decision
@@ -1,3 +1,145 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .ratelimit import Rate, Rule, SlidingWindowLimiter, parse_rate
+
+
+class SlidingWindowLimiterTestCase(SimpleTestCase):
+    """Тесты счётчиков скользящего окна"""
+
+    def setUp(self):
+        self.limiter = SlidingWindowLimiter(cache=LocMemCache('ratelimit-tests', {}))
+        self.limiter.cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), Rate(10, 60))
+        self.assertEqual(parse_rate('100/5m'), Rate(100, 300))
+        self.assertEqual(parse_rate('20/s'), Rate(20, 1))
+        with self.assertRaises(ValueError):
+            parse_rate('ten per minute')
+
+    def test_limit_within_window(self):
+        rates = [Rate(3, 60)]
+        decisions = [self.limiter.hit('client', rates, now=600) for _ in range(4)]
+
+        self.assertEqual([decision.allowed for decision in decisions], [True, True, True, False])
+        self.assertEqual([decision.remaining for decision in decisions[:3]], [2, 1, 0])
+        self.assertEqual(decisions[-1].retry_after, 60)
+
+    def test_previous_window_is_weighted(self):
+        rates = [Rate(4, 60)]
+        for _ in range(4):
+            self.limiter.hit('client', rates, now=600)
+
+        # Через 45 секунд нового окна предыдущее весит 1/4: 4 * 0.25 = 1
+        decisions = [self.limiter.hit('client', rates, now=705) for _ in range(4)]
+        self.assertEqual([decision.allowed for decision in decisions], [True, True, True, False])
+
+    def test_rejected_requests_are_not_counted(self):
+        rates = [Rate(1, 60)]
+        self.limiter.hit('client', rates, now=600)
+        for _ in range(5):
+            self.assertFalse(self.limiter.hit('client', rates, now=610).allowed)
+        self.assertEqual(self.limiter.cache.get('rl:client:60:10'), 1)
+
+    def test_burst_and_sustained_rates(self):
+        """Короткий лимит режет всплеск, длинный - общий объём"""
+        rates = [Rate(2, 1), Rate(3, 60)]
+        self.assertTrue(self.limiter.hit('client', rates, now=600.1).allowed)
+        self.assertTrue(self.limiter.hit('client', rates, now=600.2).allowed)
+        burst = self.limiter.hit('client', rates, now=600.3)
+        self.assertFalse(burst.allowed)
+        self.assertEqual(burst.window, 1)
+
+        self.assertTrue(self.limiter.hit('client', rates, now=605).allowed)
+        sustained = self.limiter.hit('client', rates, now=610)
+        self.assertFalse(sustained.allowed)
+        self.assertEqual(sustained.window, 60)
+
+    async def test_async_hit_shares_counters(self):
+        rates = [Rate(2, 60)]
+        self.assertTrue((await self.limiter.ahit('client', rates, now=600)).allowed)
+        self.assertTrue(self.limiter.hit('client', rates, now=600).allowed)
+        self.assertFalse((await self.limiter.ahit('client', rates, now=600)).allowed)
+        self.assertEqual(self.limiter.cache.get('rl:client:60:10'), 2)
+
+
+class ThrottlingMiddlewareTestCase(TestCase):
+    """Тесты ThrottlingMiddleware с политиками по пространствам имён"""
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(RATELIMIT_RULES=[{'match': ['shopapp'], 'key': 'ip', 'rates': ['3/m']}])
+    def test_limit_per_ip(self):
+        url = reverse('shopapp:index')
+        for remaining in (2, 1, 0):
+            response = self.client.get(url)
+            self.assertEqual(response['X-RateLimit-Remaining'], str(remaining))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.has_header('Retry-After'))
+
+        other_ip = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other_ip.status_code, 200)
+
+    @override_settings(RATELIMIT_RULES=[{'match': ['shopapp'], 'key': 'ip', 'rates': ['2/m']}])
+    async def test_async_stack(self):
+        """Под ASGI проверка идёт через ahit() без перехода в поток"""
+        url = reverse('shopapp:index')
+        with mock.patch.object(SlidingWindowLimiter, 'hit') as hit:
+            first = await self.async_client.get(url)
+            await self.async_client.get(url)
+            third = await self.async_client.get(url)
+        hit.assert_not_called()
+        self.assertEqual(first['X-RateLimit-Remaining'], '1')
+        self.assertEqual(third.status_code, 429)
+
+    @override_settings(RATELIMIT_RULES=[
+        {'name': 'api', 'match': ['shopapp:api'], 'key': 'user', 'rates': ['2/m']},
+        {'name': 'upload', 'match': ['myapiapp:upload'], 'key': 'ip', 'rates': ['1/m']},
+    ])
+    def test_policies_by_namespace_and_user(self):
+        api_url = reverse('shopapp:api:product-list')
+        first = User.objects.create_user(username='first', password='firstpass123')
+        second = User.objects.create_user(username='second', password='secondpass123')
+
+        self.client.force_login(first)
+        statuses = [self.client.get(api_url).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+        self.client.force_login(second)
+        self.assertEqual(self.client.get(api_url).status_code, 200)
+
+        upload_url = reverse('myapiapp:upload')
+        self.assertEqual([self.client.get(upload_url).status_code for _ in range(2)], [200, 429])
+
+        response = self.client.get(reverse('shopapp:index'))
+        self.assertFalse(response.has_header('X-RateLimit-Limit'))
+
+    @override_settings(RATELIMIT_RULES=[{'match': ['*'], 'key': 'ip', 'rates': ['1/m']}])
+    def test_exempt_paths_skip_cache(self):
+        """Исключённые пути не обращаются к ограничителю"""
+        with mock.patch.object(SlidingWindowLimiter, 'hit') as hit:
+            self.client.get('/media/avatars/missing.jpg')
+            self.client.get(reverse('admin:index'))
+            self.client.get(reverse('django.contrib.sitemaps.views.sitemap'))
+        hit.assert_not_called()
+
+    def test_rule_matching(self):
+        rule = Rule(['1/m'], match=['shopapp:api', 'myapiapp:upload'])
+        self.assertTrue(rule.matches('shopapp:api:product-list'))
+        self.assertTrue(rule.matches('myapiapp:upload'))
+        self.assertFalse(rule.matches('shopapp:apiary'))
+        self.assertFalse(rule.matches('shopapp:index'))
+
+    def test_user_key_falls_back_to_ip(self):
+        rule = Rule(['1/m'], key='user', name='test')
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(rule.get_key(request), 'test:ip:10.0.0.3')
@@ -0,0 +1,348 @@
+"""
+Общий для всех процессов кеш в файле SQLite.
+
+LocMemCache живёт в памяти одного процесса: при нескольких воркерах
+у каждого свои счётчики троттлинга, свои страницы и своя выгрузка заказов.
+Этот бэкенд хранит записи в одном файле с WAL, поэтому его видят все
+воркеры на машине, а сетевой сервер (Redis, memcached) не нужен.
+
+Вытеснение ограничивается MAX_ENTRIES и MAX_SIZE (байты значений) и идёт
+в порядке EVICTION: "lru" - давно не читанные, "fifo" - давно записанные.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .instrumentation import record_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed);
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires);
+
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size WHERE id = 1;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache_entries (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+"""
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+# Время чтения в LRU обновляется не чаще раза в секунду, чтобы горячие
+# ключи не превращали каждый get() в запись
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """
+    CACHES = {'default': {
+        'BACKEND': 'myfirstproject.cache.SQLiteCache',
+        'LOCATION': '/path/to/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 1024 * 1024, 'EVICTION': 'lru'},
+    }}
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._eviction = options.get('EVICTION', 'lru')
+        if self._eviction not in EVICTION_POLICIES:
+            raise ValueError(f"EVICTION must be one of {EVICTION_POLICIES}, got {self._eviction!r}")
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        """Соединение на поток; после fork() воркер открывает своё"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _write(self):
+        """Транзакция с блокировкой на запись сразу, чтобы чтение-изменение-запись было атомарным"""
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _is_expired(self, expires, now):
+        return expires is not None and expires <= now
+
+    def _store(self, connection, key, value, timeout, now):
+        data = self._dumps(value)
+        connection.execute(UPSERT, (key, data, self.get_backend_timeout(timeout), now, len(data)))
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        entries_over = self._max_entries and entries > self._max_entries
+        size_over = self._max_size and size > self._max_size
+        if not (entries_over or size_over):
+            return
+
+        connection.execute('DELETE FROM cache_entries WHERE expires <= ?', (now,))
+        entries, size = connection.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+
+        if self._max_entries and entries > self._max_entries:
+            keep = self._max_entries - self._max_entries // self._cull_frequency if self._cull_frequency else 0
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY accessed, key LIMIT ?)',
+                (entries - keep,),
+            )
+            size = connection.execute('SELECT bytes FROM cache_stats').fetchone()[0]
+
+        if self._max_size and size > self._max_size:
+            keep = self._max_size - self._max_size // self._cull_frequency if self._cull_frequency else 0
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, size, SUM(size) OVER (ORDER BY accessed, key ROWS UNBOUNDED PRECEDING) AS running'
+                '  FROM cache_entries'
+                ' ) WHERE running - size < ?'
+                ')',
+                (size - keep,),
+            )
+
+    def _touch_accessed(self, keys, now):
+        if self._eviction == 'lru' and keys:
+            self._connection.executemany(
+                'UPDATE cache_entries SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        data = self._dumps(value)
+        with self._write() as connection:
+            cursor = connection.execute(
+                'INSERT INTO cache_entries (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed, size = excluded.size WHERE cache_entries.expires <= ?',
+                (key, data, self.get_backend_timeout(timeout), now, len(data), now),
+            )
+            added = cursor.rowcount > 0
+            if added:
+                self._cull(connection, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many([key]).get(key, default)
+
+    def _get_many(self, keys):
+        now = time.time()
+        found, stale = self._read_many(keys, now)
+        self._touch_accessed(stale, now)
+        record_cache(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def _read_many(self, keys, now):
+        """Найденные значения и ключи, которым пора обновить время чтения"""
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache_entries WHERE key IN ({placeholders})',
+            keys,
+        ).fetchall()
+
+        found = {}
+        stale = []
+        for key, value, expires, accessed in rows:
+            if self._is_expired(expires, now):
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed >= ACCESS_RESOLUTION:
+                stale.append(key)
+        return found, stale
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        found = self._get_many(list(key_map))
+        return {key_map[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as connection:
+            self._store(connection, key, value, timeout, now)
+            self._cull(connection, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as connection:
+            for key, value in data.items():
+                key = self.make_and_validate_key(key, version=version)
+                self._store(connection, key, value, timeout, now)
+            self._cull(connection, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection.execute(
+            'UPDATE cache_entries SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись в одной транзакции"""
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[1], now):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = self._dumps(value)
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ? WHERE key = ?',
+                (data, len(data), now, key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            placeholders = ', '.join('?' * len(keys))
+            self._connection.execute(f'DELETE FROM cache_entries WHERE key IN ({placeholders})', keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        """Соединение переживает запрос: открывать файл на каждый запрос дороже, чем держать его"""
+
+    # Асинхронный API. Чтение в WAL не ждёт писателей и занимает микросекунды,
+    # поэтому SELECT выполняется прямо в цикле событий: sync_to_async обошёлся
+    # бы дороже самого запроса. Всё, что берёт блокировку записи (включая
+    # обновление времени чтения в LRU), уходит в пул потоков: при записи
+    # из другого процесса оно может ждать до BUSY_TIMEOUT, и цикл ждать не должен.
+
+    def _in_thread(self, method):
+        return sync_to_async(method, thread_sensitive=False)
+
+    async def _aget_many(self, keys):
+        now = time.time()
+        found, stale = self._read_many(keys, now)
+        if stale:
+            await self._in_thread(self._touch_accessed)(stale, now)
+        record_cache(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    async def aget(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return (await self._aget_many([key])).get(key, default)
+
+    async def aget_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        found = await self._aget_many(list(key_map))
+        return {key_map[key]: value for key, value in found.items()}
+
+    async def ahas_key(self, key, version=None):
+        return self.has_key(key, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await self._in_thread(self.add)(key, value, timeout, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        await self._in_thread(self.set)(key, value, timeout, version)
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return await self._in_thread(self.set_many)(data, timeout, version)
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return await self._in_thread(self.touch)(key, timeout, version)
+
+    async def aincr(self, key, delta=1, version=None):
+        return await self._in_thread(self.incr)(key, delta, version)
+
+    async def adecr(self, key, delta=1, version=None):
+        return await self._in_thread(self.incr)(key, -delta, version)
+
+    async def adelete(self, key, version=None):
+        return await self._in_thread(self.delete)(key, version)
+
+    async def adelete_many(self, keys, version=None):
+        await self._in_thread(self.delete_many)(keys, version)
+
+    async def aclear(self):
+        await self._in_thread(self.clear)()
@@ -0,0 +1,294 @@
+"""
+Лёгкое инструментирование запросов для продакшена.
+
+InstrumentationMiddleware меряет для каждого запроса общее время, число
+и время запросов к БД (обёртка execute на каждом соединении), попадания
+и промахи кеша (о них сообщает бэкенд через record_cache()) и время
+рендеринга TemplateResponse. Итог уходит в заголовок Server-Timing и
+в гистограммы по имени view, которые metrics_view отдаёт в текстовом
+формате Prometheus.
+
+Обёртка execute одна на весь проект: LoggingMiddleware берёт число
+запросов из RequestMetrics, QueryAudit подписывается на запросы через
+listen_queries().
+
+Гистограммы живут в памяти процесса: у каждого воркера свои, поэтому
+Prometheus должен опрашивать воркеры по отдельности. Шаблоны, которые
+функция-view рендерит сама через render(), входят во время view.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('instrumentation_metrics', default=None)
+_listeners = ContextVar('instrumentation_query_listeners', default=())
+
+
+class RequestMetrics:
+    """Показатели одного запроса"""
+    __slots__ = ('db_count', 'db_time', 'cache_hits', 'cache_misses', 'template_time')
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = None
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing; длительности в миллисекундах"""
+        parts = [f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"']
+        if self.cache_hits or self.cache_misses:
+            parts.append(f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"')
+        if self.template_time is not None:
+            parts.append(f'tpl;dur={self.template_time * 1000:.1f}')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def track():
+    """Собирает показатели блока кода, как middleware - показатели запроса"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def time_queries(execute, sql, params, many, context):
+    metrics = _current.get()
+    listeners = _listeners.get()
+    if metrics is None and not listeners:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if metrics is not None:
+            metrics.db_count += 1
+            metrics.db_time += duration
+        for listener in listeners:
+            listener(sql, duration)
+
+
+def install_query_timer(sender=None, connection=None, **kwargs):
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+def install_query_timers():
+    """Соединения, открытые до первого подключения обёртки, сигнала уже не получат"""
+    for connection in connections.all(initialized_only=True):
+        install_query_timer(connection=connection)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='instrumentation_query_timer')
+
+
+def listen_queries(listener):
+    """
+    listener(sql, duration) получает каждый запрос текущего контекста.
+    Возвращает токен для stop_listening(); вложенные подписки складываются.
+    """
+    install_query_timers()
+    return _listeners.set(_listeners.get() + (listener,))
+
+
+def stop_listening(token):
+    _listeners.reset(token)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}'
+
+
+class Histogram:
+    """Накопительные корзины, сумма и число наблюдений на набор меток"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(self.labels, labels, [('le', _format_number(bound))])
+                yield f'{self.name}_bucket{bucket_labels} {bucket_count}'
+            yield f'{self.name}_bucket{_format_labels(self.labels, labels, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_number(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {count}'
+
+
+REQUESTS = Counter('http_requests_total', 'HTTP-запросы по view, методу и статусу', ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время обработки запроса', ('view',))
+DB_QUERIES = Histogram('db_queries_per_request', 'Запросы к БД на один HTTP-запрос', ('view',), COUNT_BUCKETS)
+DB_DURATION = Histogram('db_duration_seconds', 'Время запросов к БД за один HTTP-запрос', ('view',))
+TEMPLATE_DURATION = Histogram('template_render_duration_seconds', 'Время рендеринга TemplateResponse', ('view',))
+CACHE_REQUESTS = Counter('cache_requests_total', 'Обращения к кешу по view и результату', ('view', 'result'))
+
+METRICS = [REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION, CACHE_REQUESTS]
+
+
+def observe(view, method, status, duration, metrics):
+    REQUESTS.inc((view, method, str(status)))
+    REQUEST_DURATION.observe((view,), duration)
+    DB_QUERIES.observe((view,), metrics.db_count)
+    DB_DURATION.observe((view,), metrics.db_time)
+    if metrics.template_time is not None:
+        TEMPLATE_DURATION.observe((view,), metrics.template_time)
+    if metrics.cache_hits:
+        CACHE_REQUESTS.inc((view, 'hit'), metrics.cache_hits)
+    if metrics.cache_misses:
+        CACHE_REQUESTS.inc((view, 'miss'), metrics.cache_misses)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Метрики в формате Prometheus; доступны с INTERNAL_IPS и персоналу"""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', settings.INTERNAL_IPS)
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class InstrumentationMiddleware:
+    """
+    Server-Timing и метрики по view для каждого запроса.
+
+    Ставится в начало MIDDLEWARE, чтобы время и запросы к БД покрывали
+    весь стек. Работает и в синхронном, и в асинхронном режиме.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        install_query_timers()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with track() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics, started)
+
+    def process_template_response(self, request, response):
+        """Вызывается перед рендерингом; конец отмечает post-render callback"""
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.template_time = (metrics.template_time or 0) + time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return self.process_template_response(request, response)
+
+    def finish(self, request, response, metrics, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        observe(view, request.method, response.status_code, duration, metrics)
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(duration)
+        return response
@@ -0,0 +1,185 @@
+"""
+Аудит запросов к БД: бюджет на view и поиск N+1.
+
+Каждый запрос приводится к отпечатку - SQL без литералов и параметров,
+со свёрнутыми списками IN (...). Одинаковый отпечаток, повторённый
+repeat_threshold раз за запрос, почти всегда означает обращение к связи
+в цикле. QueryAudit собирает запросы блока кода, QueryAuditMiddleware -
+запросы HTTP-запроса и сверяет их с бюджетом view:
+
+    @query_budget(10)
+    def view(request): ...
+
+    class ProductListView(ListView):
+        query_budget = 10
+
+Нарушение логируется или, в режиме 'raise', поднимает QueryBudgetExceeded.
+Запросы приходят из общей обёртки execute в myfirstproject.instrumentation.
+"""
+import logging
+import re
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .instrumentation import listen_queries, stop_listening
+
+logger = logging.getLogger('myfirstproject.queryaudit')
+
+DEFAULT_CONFIG = {
+    'ENABLED': False,
+    'MODE': 'log',
+    'DEFAULT_BUDGET': 50,
+    'REPEAT_THRESHOLD': 5,
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса: SELECT ... WHERE id = ? и WHERE id IN (...) без конкретных значений"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def query_budget(limit):
+    """Декоратор для функции-view или класса: не больше limit запросов к БД"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_budget(func):
+    """Бюджет view из resolver_match.func: у функции, у класса CBV или у viewset DRF"""
+    for owner in (func, getattr(func, 'view_class', None), getattr(func, 'cls', None)):
+        budget = getattr(owner, 'query_budget', None)
+        if budget is not None:
+            return budget
+    return None
+
+
+class QueryAudit:
+    """
+    Запросы блока кода:
+
+        with QueryAudit(budget=10) as audit:
+            client.get(url)
+        audit.count, audit.repeated(), audit.check()
+
+    Вложенные аудиты видят все запросы внутреннего блока.
+    """
+
+    def __init__(self, budget=None, repeat_threshold=DEFAULT_CONFIG['REPEAT_THRESHOLD'], label='block'):
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self.label = label
+        self.queries = []
+
+    def __enter__(self):
+        self._token = listen_queries(self.record)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stop_listening(self._token)
+
+    def record(self, sql, duration):
+        self.queries.append((sql, duration))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def shapes(self):
+        return Counter(fingerprint(sql) for sql, _ in self.queries)
+
+    def repeated(self):
+        """[(отпечаток, число повторов)] для форм, повторённых не меньше repeat_threshold раз"""
+        if not self.repeat_threshold:
+            return []
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= self.repeat_threshold]
+
+    def problems(self):
+        problems = []
+        if self.budget is not None and self.count > self.budget:
+            problems.append(f"{self.count} queries, budget is {self.budget}")
+        for shape, count in self.repeated():
+            problems.append(f"{count}x {shape}")
+        return problems
+
+    def report(self):
+        lines = [f"{self.label}: {self.count} queries in {self.duration * 1000:.1f} ms"]
+        lines.extend(f"  {count}x {shape}" for shape, count in self.shapes().most_common())
+        return '\n'.join(lines)
+
+    def check(self, mode='raise'):
+        problems = self.problems()
+        if not problems:
+            return
+        message = f"{self.label}: " + '; '.join(problems)
+        if mode == 'raise':
+            raise QueryBudgetExceeded(f"{message}\n{self.report()}")
+        logger.warning(message, extra={'data': {'view': self.label, 'queries': self.count, 'problems': problems}})
+
+
+class QueryAuditMiddleware:
+    """
+    Аудит запросов каждого HTTP-запроса по настройке QUERY_AUDIT.
+
+    Выключен, пока QUERY_AUDIT['ENABLED'] ложно; в продакшене его место
+    занимает InstrumentationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = {**DEFAULT_CONFIG, **getattr(settings, 'QUERY_AUDIT', {})}
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.mode = config['MODE']
+        self.default_budget = config['DEFAULT_BUDGET']
+        self.repeat_threshold = config['REPEAT_THRESHOLD']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with QueryAudit(repeat_threshold=self.repeat_threshold) as audit:
+            response = self.get_response(request)
+        self.check(request, audit)
+        return response
+
+    async def __acall__(self, request):
+        with QueryAudit(repeat_threshold=self.repeat_threshold) as audit:
+            response = await self.get_response(request)
+        self.check(request, audit)
+        return response
+
+    def check(self, request, audit):
+        match = request.resolver_match
+        if match is None:
+            return
+        budget = view_budget(match.func)
+        audit.budget = self.default_budget if budget is None else budget
+        audit.label = match.view_name
+        audit.check(self.mode)
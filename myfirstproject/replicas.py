@@ -0,0 +1,222 @@
+"""
+Чтение тяжёлых отчётов с реплики.
+
+Выгрузки, sitemap, RSS, списки админки и экспорт заказов пользователя
+только читают, но конкурируют с записью заказов за одну базу. Отмеченный
+код читает с реплики (алиас REPLICA['ALIAS'] в DATABASES):
+
+    @replica_view
+    def report(request): ...
+
+    with use_replica():
+        ...
+
+Всё остальное, включая любую запись, идёт в default. Реплика отстаёт на
+SYNC_INTERVAL (интервал sync_replica), поэтому после записи сессия на
+STICKY_SECONDS закрепляется за default: пользователь сразу видит свои
+новые заказы, а кеш по реплике живёт не дольше replica_timeout().
+Пока REPLICA['ALIAS'] пуст, роутер ничего не меняет.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULT_CONFIG = {
+    'ALIAS': None,
+    'SYNC_INTERVAL': 30,
+    'STICKY_SECONDS': 60,
+}
+
+SESSION_KEY = '_replica_pinned_until'
+
+_use_replica = ContextVar('replica_use', default=False)
+_request = ContextVar('replica_request', default=None)
+
+
+def replica_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'REPLICA', {})}
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA', {}).get('ALIAS')
+
+
+class RequestState:
+    """Запись и закрепление за default в рамках одного HTTP-запроса"""
+    __slots__ = ('session', 'wrote', '_pinned')
+
+    def __init__(self, session):
+        self.session = session
+        self.wrote = False
+        self._pinned = None
+
+    @property
+    def pinned(self):
+        """Сессию читаем лениво: только когда view действительно просится на реплику"""
+        if self.wrote:
+            return True
+        if self._pinned is None:
+            # Сама сессия читается из default, пока решение не принято
+            self._pinned = True
+            until = self.session.get(SESSION_KEY) if self.session is not None else None
+            self._pinned = until is not None and until > time.time()
+        return self._pinned
+
+
+def reading_replica():
+    """Алиас реплики, если чтения в текущем контексте идут на неё, иначе None"""
+    alias = replica_alias()
+    if alias is None or not _use_replica.get():
+        return None
+    state = _request.get()
+    if state is not None and state.pinned:
+        return None
+    return alias
+
+
+def replica_timeout(timeout):
+    """
+    Срок кеша для значения, собранного по реплике: не дольше интервала
+    синхронизации, иначе сброс кеша после записи вернёт старую копию надолго.
+    """
+    if reading_replica() is None:
+        return timeout
+    interval = replica_config()['SYNC_INTERVAL']
+    return interval if timeout is None else min(timeout, interval)
+
+
+@contextmanager
+def use_replica():
+    """Чтения внутри блока идут на реплику, если она настроена"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _stream_from_replica(chunks, state):
+    # Потоковый ответ читается уже после выхода из view и middleware:
+    # контекст и состояние запроса ставятся заново на каждый кусок,
+    # ASGI может отдавать их из разных потоков
+    chunks = iter(chunks)
+    while True:
+        token = _request.set(state)
+        try:
+            with use_replica():
+                chunk = next(chunks, None)
+        finally:
+            _request.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def replica_view(view):
+    """
+    Декоратор view только для чтения. TemplateResponse рендерится
+    внутри блока: ленивые queryset шаблона тоже читают с реплики.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            response = view(request, *args, **kwargs)
+            if getattr(response, 'is_rendered', True) is False:
+                response.render()
+        if response.streaming:
+            response.streaming_content = _stream_from_replica(response.streaming_content, _request.get())
+        return response
+    return wrapper
+
+
+class ReplicaChangelistMixin:
+    """Список объектов в админке читает с реплики; действия (POST) - с default"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        return replica_view(super().changelist_view)(request, extra_context)
+
+
+class ReplicaRouter:
+    """Запись - всегда default, чтение - на реплику только внутри use_replica()"""
+
+    def db_for_read(self, model, **hints):
+        if replica_alias() is None or not _use_replica.get():
+            return None
+        return reading_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if replica_alias() is None:
+            return None
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        # Явно: иначе Django пишет туда, откуда прочитан объект
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = replica_alias()
+        if alias is None:
+            return None
+        databases = {DEFAULT_DB_ALIAS, alias}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема и данные приходят на реплику копией default
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Закрепляет сессию за default на STICKY_SECONDS после запроса,
+    который что-то записал. Ставится после SessionMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = replica_config()
+        if config['ALIAS'] is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = config['STICKY_SECONDS']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        session = getattr(request, 'session', None)
+        state = RequestState(session)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        if state.wrote and session is not None:
+            session[SESSION_KEY] = time.time() + self.sticky_seconds
+        return response
+
+    async def __acall__(self, request):
+        session = getattr(request, 'session', None)
+        state = RequestState(session)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        if state.wrote and session is not None:
+            await session.aset(SESSION_KEY, time.time() + self.sticky_seconds)
+        return response
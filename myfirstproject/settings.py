@@ -62,10 +62,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    "django.middleware.cache.UpdateCacheMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "myfirstproject.instrumentation.InstrumentationMiddleware",
+    "blogapp.middleware.LoggingMiddleware",
+    "myfirstproject.queryaudit.QueryAuditMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "myfirstproject.replicas.ReplicaMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -73,8 +76,6 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "myapiapp.middleware.ThrottlingMiddleware",
-    "blogapp.middleware.LoggingMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
 ]
 
 ROOT_URLCONF = "myfirstproject.urls"
@@ -97,15 +98,21 @@ TEMPLATES = [
 WSGI_APPLICATION = "myfirstproject.wsgi.application"
 
 # Cache' settings for throttling
+# Один файл SQLite на всех воркеров: счётчики троттлинга, L2 TieredCache
+# (выгрузки заказов пользователя) и фрагменты шаблонов {% cache %}
+# общие для процессов. Тесты работают с тем же бэкендом, но
+# в файле во временном каталоге (myfirstproject.testing.TestRunner).
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'myfirstproject.cache.SQLiteCache',
+        'LOCATION': os.environ.get("DJANGO_CACHE_PATH", BASE_DIR / "cache" / "default.sqlite3"),
         'TIMEOUT': 300,
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
             'CULL_FREQUENCY': 3,
+            'EVICTION': 'lru',
         }
     }
 }
@@ -113,13 +120,63 @@ CACHES = {
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite в режиме WAL: читатели не ждут писателя, а писатель - читателей.
+# PRAGMA выполняются при открытии каждого соединения (init_command);
+# journal_mode = WAL сохраняется в самом файле. synchronous = NORMAL в WAL
+# не теряет целостность, только последние транзакции при отключении
+# питания. IMMEDIATE берёт блокировку записи в начале транзакции, поэтому
+# писатели ждут друг друга по busy_timeout, а не падают на "database is
+# locked" при повышении блокировки. Соединение живёт CONN_MAX_AGE секунд;
+# под ASGI постоянные соединения отключают: DJANGO_CONN_MAX_AGE=0.
+# Сравнение с настройками по умолчанию: manage.py sqlite_benchmark.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join(f"PRAGMA {name} = {value}" for name, value in SQLITE_PRAGMAS.items()),
+            "transaction_mode": "IMMEDIATE",
+            "timeout": SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Реплика для отчётов: файл SQLite, который sync_replica держит копией default.
+# Алиас объявлен всегда (в тестах - зеркало default), а читать с него
+# роутер начинает, только когда задан DJANGO_DB_REPLICA.
+REPLICA_PATH = os.environ.get("DJANGO_DB_REPLICA")
+
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "NAME": REPLICA_PATH or BASE_DIR / "db-replica.sqlite3",
+    "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+    "TEST": {"MIRROR": "default"},
+}
+
+DATABASE_ROUTERS = ["myfirstproject.replicas.ReplicaRouter"]
+
+TEST_RUNNER = "myfirstproject.testing.TestRunner"
+
+REPLICA = {
+    "ALIAS": "replica" if REPLICA_PATH else None,
+    # Интервал sync_replica --interval; дольше него кеш по реплике не живёт
+    "SYNC_INTERVAL": 30,
+    # Дольше интервала sync_replica, иначе свои заказы могут пропасть из отчётов
+    "STICKY_SECONDS": 60,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -169,6 +226,39 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# ThrottlingMiddleware: применяется первая политика, чей match подходит к view
+# (пространство имён URL, имя view или "*"). key - "ip" или "user" (для анонимов
+# IP); rates - все лимиты должны пропустить запрос, короткий лимит ограничивает
+# всплески, длинный - устойчивую нагрузку. View без политики (админка, карта
+# сайта, медиа) не ограничиваются, а пути из RATELIMIT_EXEMPT_PATHS
+# отсекаются ещё до разрешения URL.
+
+RATELIMIT_RULES = [
+    {'name': 'shop-api', 'match': ['shopapp:api'], 'key': 'user', 'rates': ['10/s', '120/m']},
+    {'name': 'upload', 'match': ['myapiapp:upload'], 'key': 'user', 'rates': ['10/m']},
+    {'name': 'pages', 'match': ['shopapp', 'blogapp', 'myauth'], 'key': 'ip', 'rates': ['10/s', '60/m']},
+]
+
+RATELIMIT_EXEMPT_PATHS = [
+    r'^/(static|media|__debug__)/',
+    r'^/favicon\.ico$',
+    r'^/metrics/$',
+    r'^/[\w-]+/admin/',
+    r'^/[\w-]+/sitemap\.xml$',
+]
+
+# Аудит запросов к БД (myfirstproject.queryaudit): бюджет на view задаётся
+# атрибутом query_budget, повтор одной формы запроса REPEAT_THRESHOLD раз
+# считается N+1. При разработке нарушение пишется в лог, в тестах
+# (TestRunner) - роняет запрос.
+
+QUERY_AUDIT = {
+    'ENABLED': DEBUG,
+    'MODE': 'log',
+    'DEFAULT_BUDGET': 50,
+    'REPEAT_THRESHOLD': 5,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -199,19 +289,39 @@ LOGGING = {
             'format': '{asctime} {levelname} {name} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'blogapp.handlers.JsonFormatter',
+        },
     },
     'handlers': {
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
+            '()': 'blogapp.handlers.BackgroundHandler',
+            'target': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            '()': 'blogapp.handlers.BackgroundHandler',
+            'target': 'blogapp.handlers.RotatingBatchFileHandler',
             'filename': os.path.join(LOGS_DIR, 'django.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'batch_size': 256,
+            'flush_interval': 0.5,
             'formatter': 'simple',
-            'mode': 'a',
+        },
+        'requests': {
+            'level': 'INFO',
+            '()': 'blogapp.handlers.BackgroundHandler',
+            'target': 'blogapp.handlers.RotatingBatchFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'requests.log'),
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 7,
+            'interval': 24 * 60 * 60,
+            'batch_size': 256,
+            'flush_interval': 0.5,
+            'formatter': 'json',
         },
     },
     'root': {
@@ -234,6 +344,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'blogapp.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -0,0 +1,74 @@
+"""
+Помощники для тестов.
+"""
+import copy
+import logging.config
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .queryaudit import QueryAudit
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Настройки тестового прогона: кеши SQLiteCache - те же, что в продакшене,
+    но в файлах временного каталога; нарушение бюджета запросов роняет тест;
+    чтение с реплики включают только тесты роутинга; файловые логи
+    заменены NullHandler, чтобы тесты не писали в logs/.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logging.config.dictConfig(self.test_logging(settings.LOGGING))
+        self.cache_dir = tempfile.mkdtemp(prefix='myfirstproject-tests-')
+        caches = {
+            alias: {**config, 'LOCATION': os.path.join(self.cache_dir, f'{alias}.sqlite3')}
+            if config['BACKEND'] == 'myfirstproject.cache.SQLiteCache' else config
+            for alias, config in settings.CACHES.items()
+        }
+        self.test_settings = override_settings(
+            CACHES=caches,
+            QUERY_AUDIT={**settings.QUERY_AUDIT, 'MODE': 'raise'},
+            REPLICA={**settings.REPLICA, 'ALIAS': None},
+        )
+        self.test_settings.enable()
+
+    @staticmethod
+    def test_logging(config):
+        config = copy.deepcopy(config)
+        for name, handler in config['handlers'].items():
+            if 'filename' in handler:
+                config['handlers'][name] = {'class': 'logging.NullHandler', 'level': handler.get('level', 'NOTSET')}
+        return config
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryCeilingMixin:
+    """
+    assertQueryCeiling() для TestCase: число запросов view ограничено
+    сверху и не растёт вместе с числом строк.
+    """
+    row_counts = (10, 100, 1000)
+    repeat_threshold = 5
+
+    def assertQueryCeiling(self, ceiling, fetch, populate, row_counts=None):
+        """
+        populate(rows) доводит таблицы до rows строк, fetch() запрашивает view.
+        На каждом размере запросов не больше ceiling и ни одна форма запроса
+        не повторяется repeat_threshold раз.
+        """
+        for rows in row_counts or self.row_counts:
+            populate(rows)
+            with QueryAudit(budget=ceiling, repeat_threshold=self.repeat_threshold, label=f'{rows} rows') as audit:
+                response = fetch()
+            self.assertLess(response.status_code, 400, f'{rows} rows: status {response.status_code}')
+            self.assertEqual(audit.problems(), [], audit.report())
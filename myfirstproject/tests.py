@@ -0,0 +1,319 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cache import SQLiteCache
+from .instrumentation import Histogram, time_queries, track
+from .queryaudit import QueryAudit, QueryBudgetExceeded, fingerprint
+from .replicas import replica_timeout, use_replica
+from shopapp.models import Product
+
+
+class SQLiteCacheTestCase(SimpleTestCase):
+    """Тесты общего кеша в SQLite"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'TIMEOUT': 300, 'OPTIONS': options})
+
+    def test_basic_operations(self):
+        cache = self.make_cache()
+        cache.set('a', {'x': 1})
+        self.assertEqual(cache.get('a'), {'x': 1})
+        self.assertFalse(cache.add('a', 2))
+        self.assertTrue(cache.add('b', 2))
+        self.assertEqual(cache.incr('b', 3), 5)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': {'x': 1}, 'b': 5})
+
+        cache.delete_many(['a', 'b'])
+        self.assertIsNone(cache.get('a'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_expiry(self):
+        cache = self.make_cache()
+        cache.set('short', 1, timeout=0.05)
+        cache.set('forever', 2, timeout=None)
+        time.sleep(0.1)
+
+        self.assertIsNone(cache.get('short'))
+        self.assertFalse(cache.has_key('short'))
+        self.assertTrue(cache.add('short', 3))
+        self.assertEqual(cache.get('forever'), 2)
+
+    def test_shared_between_instances(self):
+        """Два экземпляра на одном файле - как два воркера"""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('throttle', [1, 2])
+        self.assertEqual(second.get('throttle'), [1, 2])
+        second.clear()
+        self.assertIsNone(first.get('throttle'))
+
+    def test_lru_eviction_by_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for index, key in enumerate('abc'):
+            cache.set(key, index)
+        cache._connection.execute(
+            'UPDATE cache_entries SET accessed = accessed - 10 WHERE key IN (?, ?)',
+            (cache.make_key('a'), cache.make_key('b')),
+        )
+        cache.get('a')
+        cache.set('d', 3)
+
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd']), {'a': 0, 'd': 3})
+
+    def test_fifo_ignores_reads(self):
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=2, EVICTION='fifo')
+        cache.set('a', 0)
+        cache._connection.execute("UPDATE cache_entries SET accessed = accessed - 10")
+        cache.set('b', 1)
+        cache.get('a')
+        cache.set('c', 2)
+
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'c': 2})
+
+    def test_size_bound(self):
+        cache = self.make_cache(MAX_SIZE=3000, CULL_FREQUENCY=3)
+        for index in range(5):
+            cache.set(f'blob{index}', b'x' * 900)
+
+        entries, size = cache._connection.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 3000)
+        self.assertEqual(cache.get('blob4'), b'x' * 900)
+        self.assertIsNone(cache.get('blob0'))
+
+    def test_unknown_eviction_policy(self):
+        with self.assertRaises(ValueError):
+            self.make_cache(EVICTION='random')
+
+    async def test_async_api(self):
+        cache = self.make_cache()
+        self.assertTrue(await cache.aadd('counter', 1))
+        self.assertEqual(await cache.aincr('counter', 2), 3)
+        self.assertEqual(await cache.adecr('counter'), 2)
+        self.assertEqual(await cache.aget_many(['counter', 'missing']), {'counter': 2})
+        await cache.adelete_many(['counter'])
+        self.assertIsNone(cache.get('counter'))
+
+    async def test_async_write_does_not_block_loop(self):
+        """Запись ждёт чужую блокировку в потоке, цикл событий продолжает работать"""
+        cache = self.make_cache(BUSY_TIMEOUT=2)
+        cache.set('counter', 1)
+        blocker = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(blocker.close)
+        blocker.execute('BEGIN IMMEDIATE')
+        asyncio.get_running_loop().call_later(0.2, blocker.execute, 'COMMIT')
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        self.assertEqual(await cache.aincr('counter'), 2)
+        ticker.cancel()
+        self.assertGreater(ticks, 5)
+
+
+class InstrumentationTestCase(TestCase):
+    """Тесты Server-Timing и метрик Prometheus"""
+    fixtures = ['users-fixtures.json', 'products-fixtures.json']
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('shopapp:products_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('shopapp:products_list'))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{view="shopapp:products_list"}', body)
+        self.assertIn('db_queries_per_request_bucket{view="shopapp:products_list",le="+Inf"}', body)
+
+    def test_single_execute_wrapper(self):
+        """Метрики, лог запросов и аудит работают от одной обёртки execute"""
+        with QueryAudit() as audit, track() as metrics:
+            list(User.objects.all())
+        self.assertEqual((audit.count, metrics.db_count), (1, 1))
+        self.assertEqual(connection.execute_wrappers.count(time_queries), 1)
+        self.assertEqual(len(connection.execute_wrappers), 1)
+
+    def test_cache_metrics_through_middleware(self):
+        """Тесты идут на SQLiteCache, поэтому попадания видны в Server-Timing"""
+        self.assertIsInstance(caches['default'], SQLiteCache)
+        url = reverse('shopapp:products_list')
+        self.client.get(url)
+        self.assertRegex(self.client.get(url)['Server-Timing'], r'cache;desc="[1-9]\d* hits, \d+ misses"')
+
+    def test_metrics_require_internal_ip(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', 'test', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(('index',), value)
+
+        self.assertEqual(list(histogram.samples()), [
+            'test_seconds_bucket{view="index",le="0.1"} 1',
+            'test_seconds_bucket{view="index",le="1"} 2',
+            'test_seconds_bucket{view="index",le="+Inf"} 3',
+            'test_seconds_sum{view="index"} 5.55',
+            'test_seconds_count{view="index"} 3',
+        ])
+
+    def test_cache_hits_and_misses(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        cache = SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {})
+        cache.set('a', 1)
+
+        with track() as metrics:
+            cache.get('a')
+            cache.get_many(['a', 'b', 'c'])
+
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (2, 2))
+
+
+class QueryAuditTestCase(TestCase):
+    """Тесты отпечатков запросов, бюджета и поиска N+1"""
+    fixtures = ['users-fixtures.json', 'products-fixtures.json']
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT  *  FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id = %s'), fingerprint('SELECT * FROM t WHERE id = 5'))
+
+    def test_repeated_shapes(self):
+        with QueryAudit(repeat_threshold=2) as audit:
+            for pk in User.objects.values_list('pk', flat=True):
+                User.objects.get(pk=pk)
+
+        self.assertEqual(audit.count, 3)
+        [(shape, count)] = audit.repeated()
+        self.assertEqual(count, 2)
+        self.assertIn('WHERE "auth_user"."id" = ?', shape)
+        with self.assertRaises(QueryBudgetExceeded):
+            audit.check()
+
+    @override_settings(QUERY_AUDIT={'ENABLED': True, 'MODE': 'raise', 'DEFAULT_BUDGET': 1})
+    def test_middleware_raises_over_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'shopapp:product_detail'):
+            self.client.get(reverse('shopapp:product_detail', kwargs={'pk': 100}))
+
+    @override_settings(QUERY_AUDIT={'ENABLED': True, 'MODE': 'log', 'DEFAULT_BUDGET': 1})
+    def test_middleware_logs_and_uses_view_budget(self):
+        with self.assertLogs('myfirstproject.queryaudit', 'WARNING') as logs:
+            response = self.client.get(reverse('shopapp:product_detail', kwargs={'pk': 100}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget is 1', logs.output[0])
+
+        with self.assertNoLogs('myfirstproject.queryaudit', 'WARNING'):
+            self.client.get(reverse('shopapp:api:product-list'))
+
+
+class SQLitePragmasTestCase(TestCase):
+    """Тесты PRAGMA из init_command"""
+
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('synchronous', 'busy_timeout', 'cache_size', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+
+        # 1 - NORMAL, 2 - MEMORY
+        self.assertEqual(pragmas, {'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -20000, 'temp_store': 2})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(REPLICA={'ALIAS': 'replica', 'SYNC_INTERVAL': 30, 'STICKY_SECONDS': 60})
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """
+    Тесты роутинга на реплику. В тестах replica - отдельное соединение
+    с той же базой, поэтому данные нужны закоммиченные.
+    """
+    databases = {'default', 'replica'}
+    fixtures = ['users-fixtures.json', 'products-fixtures.json']
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('replica-admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200)
+        return len(queries), content
+
+    def test_router(self):
+        self.assertEqual(Product.objects.all().db, 'default')
+        with use_replica():
+            self.assertEqual(Product.objects.all().db, 'replica')
+            product = Product.objects.get(pk=100)
+        self.assertEqual(product._state.db, 'replica')
+
+        # Объект с реплики сохраняется в default
+        product.save()
+        self.assertEqual(product._state.db, 'default')
+
+    def test_replica_timeout(self):
+        self.assertEqual(replica_timeout(21600), 21600)
+        with use_replica():
+            self.assertEqual(replica_timeout(21600), 30)
+            self.assertEqual(replica_timeout(None), 30)
+
+    def test_reports_read_replica(self):
+        count, content = self.replica_queries(reverse('shopapp:products_export') + '?format=ndjson')
+        self.assertGreater(count, 0)
+        self.assertEqual(content.count(b'\n'), 3)
+
+        for url in (
+            reverse('shopapp:orders_export'),
+            reverse('shopapp:products_feed'),
+            reverse('shopapp:user_orders_export', kwargs={'user_id': 100}),
+            reverse('admin:shopapp_order_changelist'),
+            reverse('django.contrib.sitemaps.views.sitemap'),
+        ):
+            with self.subTest(url=url):
+                self.assertGreater(self.replica_queries(url)[0], 0)
+
+    def test_other_views_read_default(self):
+        self.assertEqual(self.replica_queries(reverse('shopapp:products_list'))[0], 0)
+
+    def test_write_pins_session_to_default(self):
+        response = self.client.post(reverse('shopapp:product_create'), {
+            'name': 'Replica lag', 'description': 'New', 'price': '10.00', 'discount': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+
+        count, content = self.replica_queries(reverse('shopapp:products_export') + '?format=ndjson')
+        self.assertEqual(count, 0)
+        self.assertIn('Replica lag'.encode(), content)
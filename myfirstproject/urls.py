@@ -4,11 +4,15 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from myfirstproject.instrumentation import metrics_view
+from myfirstproject.replicas import replica_view
+from shopapp.conditional import catalog_validators, conditional_view
 from shopapp.sitemaps import ShopSitemap
 from django.contrib.sitemaps.views import sitemap
 
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 sitemaps = {
@@ -21,7 +25,12 @@ urlpatterns += i18n_patterns(
     path('api/', include('myapiapp.urls')),
     path('accounts/', include('myauth.urls')),
     path("blog/", include("blogapp.urls")),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path(
+        'sitemap.xml',
+        replica_view(conditional_view(catalog_validators)(sitemap)),
+        {'sitemaps': sitemaps},
+        name='django.contrib.sitemaps.views.sitemap',
+    ),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
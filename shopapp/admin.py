@@ -1,18 +1,66 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
 from django.contrib import admin
-from django.db.models import QuerySet
-from django.http import HttpRequest
-from django.shortcuts import render, redirect
+from django.db.models import Count, F, Q, QuerySet
+from django.db.models.signals import m2m_changed
+from django.db import transaction
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpRequest, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import path
+from django.utils import timezone
 from django.contrib import messages
-import csv
-import io
 
-from .models import Product, Order
+from .models import Product, Order, OrderImportJob
 from .forms import CSVImportForm
+from .counters import counters_enabled
+from .search import search_products
+from .jobs import submit_import_job
+from myfirstproject.replicas import ReplicaChangelistMixin
+
+
+class OrderProductsFormSet(BaseInlineFormSet):
+    """
+    Инлайн пишет строки Order.products.through напрямую, а для автоматической
+    промежуточной модели Django не шлёт ни m2m_changed, ни post_save/post_delete.
+    После сохранения изменения пересылаются как m2m_changed: позиции заказа,
+    счётчики и кеш выгрузок обновляются так же, как при order.products.add/remove.
+    """
+
+    def save(self, commit=True):
+        saved = super().save(commit)
+        if commit:
+            self.send_m2m_changed()
+        return saved
+
+    def send_m2m_changed(self):
+        before, after = set(), set()
+        for form in self.initial_forms:
+            before.add((form.initial['order'], form.initial['product']))
+        for form in self.forms:
+            # У удалённых строк pk уже None, пустые новые формы не сохранялись
+            if form.instance.pk is not None:
+                after.add((form.instance.order_id, form.instance.product_id))
+
+        changes = {'post_remove': defaultdict(set), 'post_add': defaultdict(set)}
+        for order_id, product_id in before - after:
+            changes['post_remove'][order_id].add(product_id)
+        for order_id, product_id in after - before:
+            changes['post_add'][order_id].add(product_id)
+
+        orders = Order.objects.in_bulk({order_id for pairs in changes.values() for order_id in pairs})
+        for action, pairs in changes.items():
+            for order_id, product_ids in pairs.items():
+                m2m_changed.send(
+                    sender=self.model, instance=orders[order_id], action=action, reverse=False,
+                    model=Product, pk_set=product_ids, using=orders[order_id]._state.db,
+                )
 
 
 class OrderInline(admin.TabularInline):
     model = Order.products.through
+    formset = OrderProductsFormSet
     extra = 0
     verbose_name = "Заказ с этим продуктом"
     verbose_name_plural = "Заказы с этим продуктом"
@@ -20,16 +68,17 @@ class OrderInline(admin.TabularInline):
 
 @admin.action(description="Архивировать выбранные продукты")
 def mark_archived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=True)
+    # update() не трогает auto_now, а от updated_at зависят ETag и кеш фрагментов
+    queryset.update(archived=True, updated_at=timezone.now())
 
 
 @admin.action(description="Разархивировать выбранные продукты")
 def mark_unarchived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=False)
+    queryset.update(archived=False, updated_at=timezone.now())
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = [
         "name",
         "price",
@@ -78,24 +127,42 @@ class ProductAdmin(admin.ModelAdmin):
         mark_unarchived,
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу; число в запросе дополнительно ищется как цена"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        condition = Q(pk__in=search_products(Product.objects.all(), search_term, rank=False).values("pk"))
+        try:
+            condition |= Q(price=Decimal(search_term.replace(",", ".")))
+        except InvalidOperation:
+            pass
+        return queryset.filter(condition), False
+
     def orders_count(self, obj: Product) -> int:
-        return obj.orders.count()
+        return obj._orders_count
 
     orders_count.short_description = "Количество заказов"
+    orders_count.admin_order_field = "_orders_count"
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related("orders")
+        queryset = super().get_queryset(request)
+        if counters_enabled():
+            return queryset.annotate(_orders_count=F("cached_orders_count"))
+        return queryset.annotate(_orders_count=Count("orders"))
 
 
 class ProductInline(admin.TabularInline):
     model = Order.products.through
+    formset = OrderProductsFormSet
     extra = 1
     verbose_name = "Продукт в заказе"
     verbose_name_plural = "Продукты в заказе"
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     change_list_template = "admin/shopapp/order/change_list.html"
 
     list_display = [
@@ -105,6 +172,7 @@ class OrderAdmin(admin.ModelAdmin):
         "promocode",
         "created_at",
         "products_count",
+        "total",
     ]
 
     list_filter = [
@@ -119,11 +187,11 @@ class OrderAdmin(admin.ModelAdmin):
         "user__username",
     ]
 
-    readonly_fields = ["created_at"]
+    readonly_fields = ["created_at", "total"]
 
     fieldsets = [
         ("Основная информация", {
-            "fields": ("user", "created_at"),
+            "fields": ("user", "created_at", "total"),
         }),
 
         ("Доставка", {
@@ -141,12 +209,16 @@ class OrderAdmin(admin.ModelAdmin):
     delivery_address_short.short_description = "Адрес доставки"
 
     def products_count(self, obj: Order) -> int:
-        return obj.products.count()
+        return obj._products_count
 
     products_count.short_description = "Количество товаров"
+    products_count.admin_order_field = "_products_count"
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("user").prefetch_related("products")
+        queryset = super().get_queryset(request).select_related("user")
+        if counters_enabled():
+            return queryset.annotate(_products_count=F("cached_products_count"))
+        return queryset.annotate(_products_count=Count("products"))
 
     def get_urls(self):
         urls = super().get_urls()
@@ -156,6 +228,16 @@ class OrderAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.import_csv),
                 name='shopapp_order_import_csv',
             ),
+            path(
+                'import-csv/<int:job_id>/',
+                self.admin_site.admin_view(self.import_csv_status),
+                name='shopapp_order_import_csv_status',
+            ),
+            path(
+                'import-csv/<int:job_id>/progress/',
+                self.admin_site.admin_view(self.import_csv_progress),
+                name='shopapp_order_import_csv_progress',
+            ),
         ]
         return custom_urls + urls
 
@@ -169,71 +251,70 @@ class OrderAdmin(admin.ModelAdmin):
                     messages.error(request, 'Файл должен иметь расширение .csv')
                     return render(request, "admin/csv_form.html", {"form": form})
 
-                try:
-                    decoded_file = csv_file.read().decode('utf-8')
-                    io_string = io.StringIO(decoded_file)
-                    reader = csv.DictReader(io_string)
-
-                    created_orders = 0
-                    errors = []
-
-                    for row_num, row in enumerate(reader, start=2):
-                        try:
-                            delivery_address = row.get('delivery_address', '').strip()
-                            promocode = row.get('promocode', '').strip()
-                            user_id = row.get('user_id', '').strip()
-                            product_ids = row.get('product_ids', '').strip()
-
-                            if not delivery_address or not user_id:
-                                errors.append(f"Строка {row_num}: отсутствует адрес доставки или ID пользователя")
-                                continue
-
-                            try:
-                                from django.contrib.auth.models import User
-                                user = User.objects.get(id=int(user_id))
-                            except (User.DoesNotExist, ValueError):
-                                errors.append(f"Строка {row_num}: пользователь с ID {user_id} не найден")
-                                continue
-
-                            order = Order.objects.create(
-                                delivery_address=delivery_address,
-                                promocode=promocode,
-                                user=user
-                            )
-
-                            if product_ids:
-                                try:
-                                    product_id_list = [int(pid.strip()) for pid in product_ids.split(',') if
-                                                       pid.strip()]
-                                    products = Product.objects.filter(id__in=product_id_list)
-                                    order.products.set(products)
-
-                                    if len(products) != len(product_id_list):
-                                        found_ids = list(products.values_list('id', flat=True))
-                                        missing_ids = [pid for pid in product_id_list if pid not in found_ids]
-                                        errors.append(f"Строка {row_num}: товары с ID {missing_ids} не найдены")
-                                except ValueError:
-                                    errors.append(f"Строка {row_num}: неверный формат ID товаров")
-
-                            created_orders += 1
-
-                        except Exception as e:
-                            errors.append(f"Строка {row_num}: ошибка - {str(e)}")
-
-                    if created_orders > 0:
-                        messages.success(request, f'Успешно создано заказов: {created_orders}')
-
-                    if errors:
-                        for error in errors[:10]:
-                            messages.error(request, error)
-                        if len(errors) > 10:
-                            messages.error(request, f'И еще {len(errors) - 10} ошибок...')
-
-                    return redirect("admin:shopapp_order_changelist")
-
-                except Exception as e:
-                    messages.error(request, f'Ошибка при чтении файла: {str(e)}')
+                with transaction.atomic():
+                    job = OrderImportJob.objects.create(csv_file=csv_file, created_by=request.user)
+                    submit_import_job(job)
+
+                messages.success(request, f'Импорт #{job.pk} поставлен в очередь')
+                return redirect("admin:shopapp_order_import_csv_status", job_id=job.pk)
         else:
             form = CSVImportForm()
 
-        return render(request, "admin/csv_form.html", {"form": form})
\ No newline at end of file
+        return render(request, "admin/csv_form.html", {"form": form})
+
+    def import_csv_status(self, request, job_id):
+        job = get_object_or_404(OrderImportJob, pk=job_id)
+        return render(request, "admin/shopapp/order/import_status.html", {
+            "job": job,
+            "opts": self.model._meta,
+        })
+
+    def import_csv_progress(self, request, job_id):
+        job = get_object_or_404(OrderImportJob, pk=job_id)
+        return JsonResponse({
+            "id": job.pk,
+            "status": job.status,
+            "status_display": str(job.get_status_display()),
+            "finished": job.is_finished,
+            "total_rows": job.total_rows,
+            "rows_processed": job.rows_processed,
+            "created_orders": job.created_orders,
+            "errors_count": job.errors_count,
+            "errors": job.errors[:10],
+            "failure": job.failure,
+        })
+
+
+@admin.register(OrderImportJob)
+class OrderImportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "status",
+        "rows_processed",
+        "total_rows",
+        "created_orders",
+        "errors_count",
+        "created_by",
+        "created_at",
+    ]
+
+    list_filter = [
+        "status",
+    ]
+
+    readonly_fields = [
+        "csv_file",
+        "status",
+        "total_rows",
+        "rows_processed",
+        "created_orders",
+        "errors_count",
+        "errors",
+        "failure",
+        "created_by",
+        "created_at",
+        "updated_at",
+    ]
+
+    def has_add_permission(self, request):
+        return False
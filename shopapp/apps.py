@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ShopappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shopapp"
+
+    def ready(self):
+        from . import cache, counters, search, totals  # noqa: F401
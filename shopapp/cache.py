@@ -0,0 +1,310 @@
+"""
+Кеши shopapp.
+
+TieredCache - маленький LRU в памяти процесса (L1) поверх общего кеша
+Django (L2) с защитой от «набега»: одновременный пересчёт одного ключа
+делает один воркер, остальные ждут его или отдают устаревшее значение.
+
+queryset_version() и поле updated_at дают штампы версий для {% cache %}
+во фрагментах шаблонов.
+
+Выгрузка заказов пользователя (user_orders_export) живёт в TieredCache долго
+и сбрасывается сигналами: меняется заказ, его состав, позиция, товар
+из заказа или сам пользователь - удаляются записи только тех
+пользователей, чьи заказы это затронуло. Сброс повторяется после
+коммита транзакции и меняет поколение ключа, чтобы параллельный запрос
+не закешировал старые данные.
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Product, ProductImage, Order, OrderItem
+
+USER_ORDERS_EXPORT_TIMEOUT = 60 * 60 * 6
+
+EXPORTED_PRODUCT_FIELDS = {'name', 'price', 'discount'}
+EXPORTED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+class LocalLRU:
+    """Потокобезопасный LRU с TTL на запись"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            entry, local_expires = item
+            if local_expires <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, local_expires):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._data[key] = (entry, local_expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """
+    L1 в процессе поверх L2 (кеш Django) с однократным пересчётом.
+
+    В L2 лежит кортеж (значение, срок свежести, время расчёта). После срока
+    свежести запись ещё stale_timeout секунд отдаётся как устаревшая, пока
+    один запрос, взявший блокировку через cache.add(), её пересчитывает
+    (stale-while-revalidate). До срока свежести пересчёт может начаться
+    раньше с вероятностью, растущей к концу срока и со временем расчёта
+    (XFetch), поэтому популярный ключ обычно обновляется до истечения.
+
+    L1 не знает о сбросах в других процессах, поэтому держит запись
+    не дольше local_timeout секунд.
+
+    delete_many() меняет поколение ключа: пересчёт, начатый до сброса,
+    мог прочитать данные до записи, и его результат не остаётся в L2.
+    """
+
+    def __init__(self, alias='default', max_local_entries=256, local_timeout=5,
+                 stale_timeout=60, lock_timeout=30, wait_timeout=5, beta=1.0):
+        self.alias = alias
+        self.local = LocalLRU(max_local_entries)
+        self.local_timeout = local_timeout
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.beta = beta
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _lock_key(self, key):
+        return f'{key}:lock'
+
+    def _generation_key(self, key):
+        return f'{key}:generation'
+
+    def _read(self, key, now):
+        entry = self.local.get(key, now)
+        if entry is None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry, min(entry[1], now + self.local_timeout))
+        return entry
+
+    def _refresh_early(self, expires, delta, now):
+        return now - delta * self.beta * math.log(1 - random.random()) >= expires
+
+    def get_or_set(self, key, compute, timeout=DEFAULT_TIMEOUT):
+        """Значение ключа; compute() вызывается без аргументов и только одним воркером сразу"""
+        now = time.time()
+        entry = self._read(key, now)
+        if entry is not None:
+            value, expires, delta = entry
+            if now < expires and not self._refresh_early(expires, delta, now):
+                return value
+            token = self._acquire(key)
+            if token is None:
+                return value
+            return self._recompute(key, compute, timeout, token)
+
+        token = self._acquire(key)
+        if token is None:
+            entry = self._wait(key)
+            if entry is not None:
+                return entry[0]
+        return self._recompute(key, compute, timeout, token)
+
+    def _acquire(self, key):
+        token = uuid.uuid4().hex
+        return token if self.shared.add(self._lock_key(key), token, self.lock_timeout) else None
+
+    def _wait(self, key):
+        """Ждёт, пока пересчёт в другом воркере положит значение в L2"""
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            entry = self.shared.get(key)
+            if entry is not None:
+                return entry
+            if not self.shared.has_key(self._lock_key(key)):
+                return None
+        return None
+
+    def _recompute(self, key, compute, timeout, token):
+        try:
+            generation = self.shared.get(self._generation_key(key))
+            started = time.time()
+            value = compute()
+            now = time.time()
+            if timeout == DEFAULT_TIMEOUT:
+                timeout = self.shared.default_timeout
+            expires = math.inf if timeout is None else now + timeout
+            entry = (value, expires, now - started)
+            self.shared.set(key, entry, None if timeout is None else timeout + self.stale_timeout)
+            # Проверка после set: сброс между проверкой и записью тоже не теряется
+            if self.shared.get(self._generation_key(key)) != generation:
+                self.shared.delete(key)
+                return value
+            self.local.set(key, entry, min(entry[1], now + self.local_timeout))
+            return value
+        finally:
+            if token is not None and self.shared.get(self._lock_key(key)) == token:
+                self.shared.delete(self._lock_key(key))
+
+    def delete_many(self, keys):
+        self.local.delete_many(keys)
+        self.shared.set_many({self._generation_key(key): uuid.uuid4().hex for key in keys}, None)
+        self.shared.delete_many(keys)
+
+    def clear_local(self):
+        self.local.clear()
+
+
+def get_tiered_cache():
+    options = getattr(settings, 'SHOPAPP_TIERED_CACHE', {})
+    return TieredCache(**options)
+
+
+user_orders_cache = get_tiered_cache()
+
+
+def queryset_stamp(queryset):
+    """Число строк и последний updated_at выборки одним агрегирующим запросом"""
+    stamp = queryset.order_by().aggregate(count=Count('pk'), updated=Max('updated_at'))
+    return stamp['count'], stamp['updated']
+
+
+def queryset_version(queryset):
+    """
+    Штамп версии выборки для ключей кеша фрагментов.
+
+    Любое сохранение, добавление или удаление строки меняет штамп.
+    """
+    count, updated = queryset_stamp(queryset)
+    return f"{count}:{updated.timestamp() if updated else 0}"
+
+
+def user_orders_export_key(user_id):
+    return f"user_orders_export_{user_id}"
+
+
+def user_orders_export_timeout():
+    return getattr(settings, 'SHOPAPP_USER_ORDERS_EXPORT_TIMEOUT', USER_ORDERS_EXPORT_TIMEOUT)
+
+
+def invalidate_user_orders(user_ids):
+    """
+    Удаляет выгрузки пользователей сейчас и ещё раз после коммита; каждый
+    сброс меняет поколение, и выгрузка, собранная до коммита, не кешируется.
+    """
+    keys = [user_orders_export_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if not keys:
+        return
+    user_orders_cache.delete_many(keys)
+    transaction.on_commit(lambda: user_orders_cache.delete_many(keys))
+
+
+def _order_owners(**lookups):
+    return Order.objects.filter(**lookups).values_list('user_id', flat=True).distinct()
+
+
+@receiver(post_init, sender=Order)
+def remember_order_owner(sender, instance, **kwargs):
+    instance._export_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    """При смене владельца сбрасывается и выгрузка прежнего"""
+    invalidate_user_orders([instance.user_id, instance._export_user_id])
+    instance._export_user_id = instance.user_id
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_orders([instance.user_id])
+        return
+
+    if action == 'pre_clear':
+        instance._export_user_ids = list(_order_owners(products=instance))
+    elif action == 'post_clear':
+        invalidate_user_orders(getattr(instance, '_export_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_orders(_order_owners(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not EXPORTED_PRODUCT_FIELDS.intersection(update_fields):
+        return
+    invalidate_user_orders(_order_owners(products=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_owners(sender, instance, **kwargs):
+    instance._export_user_ids = list(_order_owners(products=instance))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_user_orders(getattr(instance, '_export_user_ids', []))
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    """Позиция меняет Order.total, который попадает в выгрузку"""
+    invalidate_user_orders(_order_owners(pk=instance.order_id))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not EXPORTED_USER_FIELDS.intersection(update_fields)):
+        return
+    invalidate_user_orders([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    """Картинки выводятся в карточке товара: меняется и её штамп"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
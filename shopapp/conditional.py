@@ -0,0 +1,95 @@
+"""
+Условные GET-запросы: ETag и Last-Modified по штампам версий.
+
+Валидаторы считаются до вызова view одним запросом к updated_at,
+поэтому на совпавший If-None-Match / If-Modified-Since отдаётся 304
+без выборки строк и рендеринга тела.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+from .cache import queryset_stamp
+from .models import Product
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def conditional_response(request, validators, respond):
+    """
+    304/412 по валидаторам (etag, last_modified) или ответ respond() с ними в заголовках.
+
+    То же, что django.views.decorators.http.condition, но валидаторы
+    считаются один раз и подходят и для view, и для действий DRF.
+    """
+    etag, last_modified = validators
+    etag = quote_etag(etag) if etag else None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = respond()
+
+    if request.method in ('GET', 'HEAD'):
+        if timestamp is not None and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        if etag and not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+    return response
+
+
+def conditional_view(validators):
+    """Декоратор: validators(request, *args, **kwargs) -> (etag, last_modified)"""
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            return conditional_response(
+                request,
+                validators(request, *args, **kwargs),
+                lambda: view(request, *args, **kwargs),
+            )
+        return inner
+    return decorator
+
+
+def queryset_validators(queryset, *vary):
+    """ETag из штампа выборки и vary, Last-Modified - последний updated_at"""
+    count, updated = queryset_stamp(queryset)
+    return make_etag(count, updated.timestamp() if updated else 0, *vary), updated
+
+
+def _viewer(request):
+    """
+    HTML-страницы содержат шапку пользователя и форму с CSRF-токеном,
+    поэтому ETag зависит от пользователя и от секрета CSRF: после
+    входа и выхода токен меняется, и старая страница не должна прийти 304.
+    Секрет попадает только в хеш ETag.
+    """
+    user = request.user.pk if request.user.is_authenticated else ''
+    return f"{user}:{request.META.get('CSRF_COOKIE', '')}"
+
+
+def product_detail_validators(request, pk, **kwargs):
+    updated = next(iter(Product.objects.filter(pk=pk).order_by().values_list('updated_at', flat=True)[:1]), None)
+    if updated is None:
+        return None, None
+    return make_etag(pk, updated.timestamp(), get_language(), _viewer(request)), updated
+
+
+def product_list_validators(request, *args, **kwargs):
+    return queryset_validators(
+        Product.objects.filter(archived=False),
+        request.GET.urlencode(),
+        get_language(),
+        _viewer(request),
+    )
+
+
+def catalog_validators(request, *args, **kwargs):
+    """Фид и карта сайта: активные товары, без привязки к пользователю"""
+    return queryset_validators(Product.objects.filter(archived=False), get_language())
@@ -0,0 +1,81 @@
+"""
+Денормализованные счётчики Product.cached_orders_count и Order.cached_products_count.
+
+Включаются настройкой SHOPAPP_DENORMALIZED_COUNTERS. Пока она выключена,
+админка считает связи аннотацией Count(), а сигналы ничего не пишут.
+После включения счётчики нужно один раз пересчитать командой recount_counters.
+"""
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Order
+
+
+def counters_enabled():
+    return getattr(settings, 'SHOPAPP_DENORMALIZED_COUNTERS', False)
+
+
+def links_count(field):
+    links = (
+        Order.products.through.objects
+        .filter(**{field: OuterRef('pk')})
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(links), Value(0))
+
+
+def refresh_counters(order_ids=None, product_ids=None):
+    """Пересчитывает счётчики одним UPDATE на модель; None означает все строки"""
+    if order_ids is None or order_ids:
+        orders = Order.objects.all() if order_ids is None else Order.objects.filter(pk__in=order_ids)
+        orders.update(cached_products_count=links_count('order_id'))
+    if product_ids is None or product_ids:
+        products = Product.objects.all() if product_ids is None else Product.objects.filter(pk__in=product_ids)
+        products.update(cached_orders_count=links_count('product_id'))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not counters_enabled():
+        return
+
+    if action == 'pre_clear':
+        related = instance.orders if reverse else instance.products
+        instance._cleared_pks = set(related.values_list('pk', flat=True))
+        return
+
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_pks', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        refresh_counters(order_ids=pk_set, product_ids=[instance.pk])
+    else:
+        refresh_counters(order_ids=[instance.pk], product_ids=pk_set)
+
+
+@receiver(pre_delete, sender=Order)
+@receiver(pre_delete, sender=Product)
+def remember_links_before_delete(sender, instance, **kwargs):
+    if not counters_enabled():
+        return
+    related = instance.products if sender is Order else instance.orders
+    instance._linked_pks = list(related.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Product)
+def refresh_counters_after_delete(sender, instance, **kwargs):
+    linked_pks = getattr(instance, '_linked_pks', None)
+    if not linked_pks:
+        return
+    if sender is Order:
+        refresh_counters(order_ids=[], product_ids=linked_pks)
+    else:
+        refresh_counters(order_ids=linked_pks, product_ids=[])
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+
+from django.db import models
+from django.http import StreamingHttpResponse
+
+from .models import Product, Order
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _decimal_to_str(value):
+    return str(value) if value is not None else None
+
+
+CONVERTERS = {
+    models.DateTimeField: _isoformat,
+    models.DateField: _isoformat,
+    models.DecimalField: _decimal_to_str,
+}
+
+
+class Exporter:
+    """
+    Выгрузка модели пачками через values_list(), без создания объектов моделей.
+
+    Строки идут кортежами в порядке columns; значения сразу приводятся
+    к типам, которые понимают json и csv.
+    """
+    model = None
+    root = None
+    fields = ()
+    extra_columns = ()
+    batch_size = EXPORT_BATCH_SIZE
+
+    def __init__(self, queryset=None, batch_size=None):
+        self.queryset = queryset if queryset is not None else self.get_queryset()
+        if batch_size:
+            self.batch_size = batch_size
+        self.converters = self.get_converters()
+
+    @property
+    def columns(self):
+        return tuple(self.fields) + tuple(self.extra_columns)
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def get_converters(self):
+        converters = []
+        for name in self.fields:
+            field = self.model._meta.get_field(name.removesuffix('_id'))
+            converter = None
+            for field_class, func in CONVERTERS.items():
+                if isinstance(field, field_class):
+                    converter = func
+                    break
+            converters.append(converter)
+        return converters
+
+    def extend_rows(self, pks, rows):
+        """Хук для колонок, которых нет в таблице модели (например, M2M)"""
+        return rows
+
+    def iter_batches(self):
+        """Keyset-пагинация по pk: каждая пачка - один запрос, глубина не влияет на цену"""
+        queryset = self.queryset.order_by('pk').values_list('pk', *self.fields)
+        converters = [(index, func) for index, func in enumerate(self.converters) if func is not None]
+
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1][0]
+
+            pks = []
+            rows = []
+            for row in batch:
+                pks.append(row[0])
+                row = list(row[1:])
+                for index, func in converters:
+                    row[index] = func(row[index])
+                rows.append(row)
+
+            yield self.extend_rows(pks, rows)
+
+
+class OrderExporter(Exporter):
+    model = Order
+    root = 'orders'
+    fields = ('id', 'delivery_address', 'promocode', 'created_at', 'user_id', 'total')
+    extra_columns = ('product_ids',)
+
+    def extend_rows(self, pks, rows):
+        """id товаров на всю пачку одним запросом к Order.products.through"""
+        product_ids = defaultdict(list)
+        links = (
+            Order.products.through.objects
+            .filter(order_id__in=pks)
+            .order_by('order_id', 'product_id')
+            .values_list('order_id', 'product_id')
+        )
+        for order_id, product_id in links:
+            product_ids[order_id].append(product_id)
+        return [row + [product_ids[pk]] for pk, row in zip(pks, rows)]
+
+
+class ProductExporter(Exporter):
+    model = Product
+    root = 'products'
+    fields = (
+        'id', 'name', 'description', 'price', 'discount',
+        'created_at', 'archived', 'created_by_id',
+    )
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def write_json(exporter):
+    """{"<root>": [{...}, ...]} - массив собирается по частям"""
+    columns = exporter.columns
+    yield '{%s: [' % _dumps(exporter.root)
+    separator = ''
+    for rows in exporter.iter_batches():
+        yield separator + ', '.join(_dumps(dict(zip(columns, row))) for row in rows)
+        separator = ', '
+    yield ']}'
+
+
+def write_ndjson(exporter):
+    """Один JSON-объект на строку"""
+    columns = exporter.columns
+    for rows in exporter.iter_batches():
+        yield ''.join(_dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def write_csv(exporter):
+    """CSV с заголовком; списки пишутся через запятую, как в импорте заказов"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(exporter.columns)
+    for rows in exporter.iter_batches():
+        writer.writerows(
+            [','.join(map(str, value)) if isinstance(value, list) else value for value in row]
+            for row in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_columnar(exporter):
+    """{"columns": [...], "batches": [[[col1...], [col2...]], ...]} - пачка хранится по колонкам"""
+    yield '{"columns": %s, "batches": [' % _dumps(list(exporter.columns))
+    separator = ''
+    for rows in exporter.iter_batches():
+        yield separator + _dumps([list(column) for column in zip(*rows)])
+        separator = ', '
+    yield ']}'
+
+
+FORMATS = {
+    'json': (write_json, 'application/json', 'json'),
+    'ndjson': (write_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (write_csv, 'text/csv', 'csv'),
+    'columnar': (write_columnar, 'application/json', 'json'),
+}
+
+
+def gzip_stream(chunks, encoding='utf-8'):
+    """Сжимает поток на лету, не накапливая его целиком"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(exporter, export_format, compress=False):
+    """StreamingHttpResponse с выгрузкой в нужном формате"""
+    writer, content_type, extension = FORMATS[export_format]
+    content = writer(exporter)
+    response = StreamingHttpResponse(
+        gzip_stream(content) if compress else content,
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = f'attachment; filename="{exporter.root}.{extension}"'
+    return response
@@ -0,0 +1,135 @@
+"""
+Фильтры каталога и счётчики фасетов.
+
+Фасеты считаются «дизъюнктивно»: каждая группа применяет все фильтры
+запроса, кроме своих, чтобы клиент видел, сколько товаров даст соседний
+диапазон. На группу уходит ровно один агрегирующий запрос.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django_filters import rest_framework as filters
+
+from .models import Product
+
+PRICE_RANGES = (
+    ('0-1000', None, 1000),
+    ('1000-5000', 1000, 5000),
+    ('5000-20000', 5000, 20000),
+    ('20000+', 20000, None),
+)
+
+DISCOUNT_RANGES = (
+    ('0', None, 1),
+    ('1-9', 1, 10),
+    ('10-29', 10, 30),
+    ('30+', 30, None),
+)
+
+CREATED_WINDOWS = (
+    ('1d', timedelta(days=1)),
+    ('7d', timedelta(days=7)),
+    ('30d', timedelta(days=30)),
+    ('365d', timedelta(days=365)),
+)
+
+MAX_CREATOR_FACETS = 20
+
+
+class ProductFilter(filters.FilterSet):
+    """Диапазоны цены, скидки и даты создания, архивность и автор"""
+
+    class Meta:
+        model = Product
+        fields = {
+            'price': ['gte', 'lte', 'lt'],
+            'discount': ['gte', 'lte', 'lt'],
+            'created_at': ['gte', 'lt'],
+            'archived': ['exact'],
+            'created_by': ['exact'],
+        }
+
+
+def _range_q(field, gte, lt):
+    bounds = {}
+    if gte is not None:
+        bounds[f'{field}__gte'] = gte
+    if lt is not None:
+        bounds[f'{field}__lt'] = lt
+    return Q(**bounds)
+
+
+def _count_ranges(queryset, field, ranges):
+    counts = queryset.aggregate(**{
+        f'_{index}': Count('pk', filter=_range_q(field, gte, lt))
+        for index, (key, gte, lt) in enumerate(ranges)
+    })
+    return [
+        {'key': key, 'gte': gte, 'lt': lt, 'count': counts[f'_{index}']}
+        for index, (key, gte, lt) in enumerate(ranges)
+    ]
+
+
+def price_facet(queryset):
+    return _count_ranges(queryset, 'price', PRICE_RANGES)
+
+
+def discount_facet(queryset):
+    return _count_ranges(queryset, 'discount', DISCOUNT_RANGES)
+
+
+def created_at_facet(queryset):
+    now = timezone.now()
+    ranges = [(key, (now - delta).isoformat(), None) for key, delta in CREATED_WINDOWS]
+    return _count_ranges(queryset, 'created_at', ranges)
+
+
+def archived_facet(queryset):
+    counts = queryset.aggregate(
+        active=Count('pk', filter=Q(archived=False)),
+        archived=Count('pk', filter=Q(archived=True)),
+    )
+    return [
+        {'value': False, 'count': counts['active']},
+        {'value': True, 'count': counts['archived']},
+    ]
+
+
+def created_by_facet(queryset):
+    rows = (
+        queryset
+        .values('created_by', 'created_by__username')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'created_by')[:MAX_CREATOR_FACETS]
+    )
+    return [
+        {'value': row['created_by'], 'username': row['created_by__username'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+FACETS = {
+    'price': (('price__gte', 'price__lte', 'price__lt'), price_facet),
+    'discount': (('discount__gte', 'discount__lte', 'discount__lt'), discount_facet),
+    'created_at': (('created_at__gte', 'created_at__lt'), created_at_facet),
+    'archived': (('archived',), archived_facet),
+    'created_by': (('created_by',), created_by_facet),
+}
+
+
+def product_facets(data, queryset, groups=FACETS):
+    """
+    Счётчики по группам фасетов для GET-параметров data.
+
+    queryset - выборка до ProductFilter (например, после поиска);
+    каждая группа фильтруется всеми параметрами, кроме своих.
+    """
+    result = {}
+    for name in groups:
+        params, count = FACETS[name]
+        group_data = data.copy()
+        for param in params:
+            group_data.pop(param, None)
+        result[name] = count(ProductFilter(group_data, queryset=queryset).qs)
+    return result
@@ -0,0 +1,154 @@
+import csv
+import io
+from collections import namedtuple
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import invalidate_user_orders
+from .counters import counters_enabled, refresh_counters
+from .models import Product, Order, OrderItem, line_total
+from .totals import build_items
+
+IMPORT_BATCH_SIZE = 1000
+
+
+ParsedOrder = namedtuple('ParsedOrder', 'row_num delivery_address promocode user_id product_ids')
+
+
+class OrderCSVImporter:
+    """
+    Импорт заказов из CSV пачками.
+
+    На пачку уходит фиксированное число запросов: по одному на проверку
+    пользователей и товаров и по одному bulk_create на заказы и на связи
+    с товарами. Каждая пачка пишется в своей транзакции.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'SHOPAPP_IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+        self.created = 0
+        self.errors = []
+
+    def import_file(self, file, skip_rows=0):
+        """
+        Читает файл потоково, не декодируя его целиком в память.
+
+        skip_rows пропускает уже импортированные строки при возобновлении.
+        """
+        file.seek(0)
+        text = io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8', newline='')
+        try:
+            reader = csv.DictReader(text)
+            self.import_rows(islice(reader, skip_rows, None), start_row=2 + skip_rows)
+        finally:
+            text.detach()
+
+    def import_rows(self, rows, start_row=2):
+        rows = enumerate(rows, start=start_row)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            self.import_batch(chunk)
+
+    def import_batch(self, chunk):
+        parsed = [order for order in (self.parse_row(row_num, row) for row_num, row in chunk) if order]
+        valid, products = self.resolve(parsed)
+
+        with transaction.atomic():
+            if valid:
+                orders = Order.objects.bulk_create([
+                    Order(
+                        delivery_address=order.delivery_address,
+                        promocode=order.promocode,
+                        user_id=order.user_id,
+                        total=sum(
+                            (line_total(products[pk][0], 1, products[pk][1])
+                             for pk in order.product_ids if pk in products),
+                            Decimal('0'),
+                        ),
+                    )
+                    for order in valid
+                ])
+                Order.products.through.objects.bulk_create([
+                    Order.products.through(order_id=created.pk, product_id=product_id)
+                    for created, order in zip(orders, valid)
+                    for product_id in order.product_ids
+                    if product_id in products
+                ])
+                OrderItem.objects.bulk_create([
+                    item
+                    for created, order in zip(orders, valid)
+                    for item in build_items(
+                        created.pk,
+                        [(pk, *products[pk]) for pk in order.product_ids if pk in products],
+                    )
+                ])
+                if counters_enabled():
+                    refresh_counters(
+                        order_ids=[order.pk for order in orders],
+                        product_ids={pk for order in valid for pk in order.product_ids if pk in products},
+                    )
+                invalidate_user_orders({order.user_id for order in valid})
+                self.created += len(orders)
+            self.batch_imported(chunk)
+
+    def batch_imported(self, chunk):
+        """Вызывается внутри транзакции пачки; подклассы сохраняют здесь прогресс"""
+
+    def resolve(self, parsed):
+        """Проверяет пользователей и товары всей пачки двумя запросами; цены товаров идут в снимок позиций"""
+        if not parsed:
+            return [], {}
+
+        user_ids = set(
+            User.objects.filter(pk__in={order.user_id for order in parsed}).values_list('pk', flat=True)
+        )
+        products = {
+            pk: (price, discount)
+            for pk, price, discount in Product.objects.filter(
+                pk__in={pk for order in parsed for pk in order.product_ids}
+            ).values_list('pk', 'price', 'discount')
+        }
+
+        valid = []
+        for order in parsed:
+            if order.user_id not in user_ids:
+                self.errors.append(f"Строка {order.row_num}: пользователь с ID {order.user_id} не найден")
+                continue
+            missing_ids = [pk for pk in order.product_ids if pk not in products]
+            if missing_ids:
+                self.errors.append(f"Строка {order.row_num}: товары с ID {missing_ids} не найдены")
+            valid.append(order)
+
+        return valid, products
+
+    def parse_row(self, row_num, row):
+        delivery_address = (row.get('delivery_address') or '').strip()
+        promocode = (row.get('promocode') or '').strip()
+        user_id = (row.get('user_id') or '').strip()
+        product_ids = (row.get('product_ids') or '').strip()
+
+        if not delivery_address or not user_id:
+            self.errors.append(f"Строка {row_num}: отсутствует адрес доставки или ID пользователя")
+            return None
+
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            self.errors.append(f"Строка {row_num}: пользователь с ID {user_id} не найден")
+            return None
+
+        try:
+            product_id_list = list(dict.fromkeys(
+                int(pid.strip()) for pid in product_ids.split(',') if pid.strip()
+            ))
+        except ValueError:
+            self.errors.append(f"Строка {row_num}: неверный формат ID товаров")
+            product_id_list = []
+
+        return ParsedOrder(row_num, delivery_address, promocode, user_id, product_id_list)
@@ -0,0 +1,152 @@
+import csv
+import io
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importers import OrderCSVImporter
+from .models import OrderImportJob
+
+logger = logging.getLogger(__name__)
+
+MAX_STORED_ERRORS = 100
+
+# Задача RUNNING без пачки дольше этого срока считается брошенной
+IMPORT_LEASE_SECONDS = 300
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Локальный пул потоков для импорта; брокер не нужен"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SHOPAPP_IMPORT_WORKERS', 2),
+                thread_name_prefix='order-import',
+            )
+        return _executor
+
+
+def submit_import_job(job):
+    """Ставит задачу в пул после коммита транзакции, в которой она создана"""
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.pk))
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_import_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class JobLost(Exception):
+    """Задачу захватил другой исполнитель"""
+
+
+def lease_expired_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'SHOPAPP_IMPORT_LEASE_SECONDS', IMPORT_LEASE_SECONDS))
+
+
+def claim_job(job_id):
+    """
+    Атомарно захватывает задачу: PENDING или RUNNING, чей исполнитель
+    не отмечался дольше срока аренды. Возвращает токен владельца или None.
+    """
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+    stale = Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=lease_expired_before())
+    claimed = OrderImportJob.objects.filter(
+        Q(status=OrderImportJob.STATUS_PENDING) | (Q(status=OrderImportJob.STATUS_RUNNING) & stale),
+        pk=job_id,
+    ).update(status=OrderImportJob.STATUS_RUNNING, owner=owner, heartbeat_at=now, updated_at=now)
+    return owner if claimed else None
+
+
+class JobOrderImporter(OrderCSVImporter):
+    """Импорт, который после каждой пачки сохраняет смещение в OrderImportJob"""
+
+    def __init__(self, job, owner, **kwargs):
+        super().__init__(**kwargs)
+        self.job = job
+        self.owner = owner
+        self.saved_errors = 0
+
+    def batch_imported(self, chunk):
+        new_errors = self.errors[self.saved_errors:]
+        self.saved_errors = len(self.errors)
+
+        stored = self.job.errors
+        if len(stored) < MAX_STORED_ERRORS:
+            stored.extend(new_errors[:MAX_STORED_ERRORS - len(stored)])
+
+        now = timezone.now()
+        updated = OrderImportJob.objects.filter(pk=self.job.pk, owner=self.owner).update(
+            rows_processed=F('rows_processed') + len(chunk),
+            created_orders=F('created_orders') + self.created,
+            errors_count=F('errors_count') + len(new_errors),
+            errors=stored,
+            heartbeat_at=now,
+            updated_at=now,
+        )
+        if not updated:
+            # Откатывает транзакцию пачки вместе с заказами
+            raise JobLost(self.job.pk)
+        self.created = 0
+
+
+def count_rows(file):
+    file.seek(0)
+    text = io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8', newline='')
+    try:
+        return sum(1 for _ in csv.DictReader(text))
+    finally:
+        text.detach()
+
+
+def run_import_job(job_id):
+    """
+    Выполняет или продолжает импорт.
+
+    Смещение хранится в rows_processed и обновляется в одной транзакции
+    с пачкой заказов, поэтому после падения импорт продолжается
+    с первой незакоммиченной строки. Задачу одновременно ведёт один
+    исполнитель: пачка коммитится, только пока он владелец.
+    """
+    owner = claim_job(job_id)
+    if owner is None:
+        return
+
+    owned = OrderImportJob.objects.filter(pk=job_id, owner=owner)
+    job = OrderImportJob.objects.get(pk=job_id)
+    try:
+        with job.csv_file.open('rb') as csv_file:
+            if job.total_rows is None:
+                job.total_rows = count_rows(csv_file.file)
+                owned.update(total_rows=job.total_rows, updated_at=timezone.now())
+
+            importer = JobOrderImporter(job, owner)
+            importer.import_file(csv_file.file, skip_rows=job.rows_processed)
+    except JobLost:
+        logger.warning("Order import job %s was taken over by another runner", job_id)
+        return
+    except Exception as e:
+        logger.exception("Order import job %s failed", job_id)
+        owned.update(
+            status=OrderImportJob.STATUS_FAILED,
+            failure=str(e),
+            updated_at=timezone.now(),
+        )
+        return
+
+    owned.update(status=OrderImportJob.STATUS_DONE, updated_at=timezone.now())
@@ -50,6 +50,7 @@ class Command(BaseCommand):
                 "fields": {
                     "name": "Fixture Product 1",
                     "description": "Test product from fixture",
+                    "excerpt": "Test product from fixture",
                     "price": "999.99",
                     "discount": 10,
                     "created_at": "2024-01-01T10:00:00Z",
@@ -63,6 +64,7 @@ class Command(BaseCommand):
                 "fields": {
                     "name": "Fixture Product 2",
                     "description": "Another test product",
+                    "excerpt": "Another test product",
                     "price": "1999.99",
                     "discount": 0,
                     "created_at": "2024-01-01T11:00:00Z",
@@ -76,6 +78,7 @@ class Command(BaseCommand):
                 "fields": {
                     "name": "Fixture Product 3",
                     "description": "Third test product",
+                    "excerpt": "Third test product",
                     "price": "2999.99",
                     "discount": 15,
                     "created_at": "2024-01-01T12:00:00Z",
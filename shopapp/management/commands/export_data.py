@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from myfirstproject.replicas import use_replica
+from shopapp.exports import FORMATS, OrderExporter, ProductExporter
+
+EXPORTERS = {
+    'products': ProductExporter,
+    'orders': OrderExporter,
+}
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка товаров или заказов в stdout или файл; читает с реплики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=EXPORTERS)
+        parser.add_argument('--format', default='ndjson', choices=FORMATS)
+        parser.add_argument('--output', help='Файл; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        writer = FORMATS[options['format']][0]
+        if not options['output']:
+            self.export(writer, options['model'], lambda chunk: self.stdout.write(chunk, ending=''))
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            self.export(writer, options['model'], output.write)
+
+    def export(self, writer, model, write):
+        with use_replica():
+            for chunk in writer(EXPORTERS[model]()):
+                write(chunk)
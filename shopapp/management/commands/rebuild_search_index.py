@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from shopapp.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс товаров'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Перестраиваем индекс...')
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Индекс перестроен'))
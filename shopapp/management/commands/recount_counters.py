@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from shopapp.counters import refresh_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики заказов и товаров'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываем счётчики...')
+        refresh_counters()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from shopapp.jobs import run_import_job
+from shopapp.models import OrderImportJob
+
+
+class Command(BaseCommand):
+    help = 'Выполняет незавершённые импорты заказов, продолжая с сохранённой строки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int, help='ID задач; по умолчанию все незавершённые')
+
+    def handle(self, *args, **options):
+        jobs = OrderImportJob.objects.filter(
+            status__in=[OrderImportJob.STATUS_PENDING, OrderImportJob.STATUS_RUNNING]
+        ).order_by('pk')
+        if options['job_ids']:
+            jobs = jobs.filter(pk__in=options['job_ids'])
+
+        job_ids = list(jobs.values_list('pk', flat=True))
+        if not job_ids:
+            self.stdout.write('Незавершённых импортов нет')
+            return
+
+        for job_id in job_ids:
+            self.stdout.write(f'Импорт #{job_id}...')
+            run_import_job(job_id)
+            job = OrderImportJob.objects.get(pk=job_id)
+            self.stdout.write(
+                f'Импорт #{job_id}: {job.get_status_display()}, '
+                f'строк {job.rows_processed}, заказов {job.created_orders}, ошибок {job.errors_count}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Готово'))
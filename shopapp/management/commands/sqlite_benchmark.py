@@ -0,0 +1,158 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE bench_order (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    delivery_address TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    total NUMERIC NOT NULL
+);
+CREATE INDEX bench_order_created_at ON bench_order (created_at DESC, id DESC);
+CREATE TABLE bench_item (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES bench_order (id),
+    product_id INTEGER NOT NULL,
+    unit_price NUMERIC NOT NULL
+);
+CREATE INDEX bench_item_order ON bench_item (order_id);
+"""
+
+READ = """
+SELECT o.id, o.total, COUNT(i.id)
+FROM bench_order o LEFT JOIN bench_item i ON i.order_id = o.id
+WHERE o.user_id = ?
+GROUP BY o.id ORDER BY o.created_at DESC, o.id DESC LIMIT 20
+"""
+
+# Прежняя конфигурация: журнал отката, synchronous = FULL, соединение на запрос
+PROFILES = {
+    'default': {'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'persistent': False},
+    'tuned': {'pragmas': getattr(settings, 'SQLITE_PRAGMAS', {}), 'persistent': True},
+}
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, profile, operation, deadline):
+        super().__init__(daemon=True)
+        self.path = path
+        self.profile = profile
+        self.operation = operation
+        self.deadline = deadline
+        self.done = 0
+        self.errors = 0
+        self.random = random.Random()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        for name, value in self.profile['pragmas'].items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def run(self):
+        connection = self.connect() if self.profile['persistent'] else None
+        while time.monotonic() < self.deadline:
+            current = connection or self.connect()
+            try:
+                self.operation(current, self.random)
+                self.done += 1
+            except sqlite3.OperationalError:
+                self.errors += 1
+            finally:
+                if connection is None:
+                    current.close()
+        if connection is not None:
+            connection.close()
+
+
+def read(connection, rng):
+    connection.execute(READ, (rng.randrange(100),)).fetchall()
+
+
+def write(connection, rng):
+    """Заказ с тремя позициями в одной транзакции, как создание заказа"""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        order_id = connection.execute(
+            'INSERT INTO bench_order (user_id, delivery_address, created_at, total) VALUES (?, ?, ?, ?)',
+            (rng.randrange(100), 'Benchmark street', time.time(), 300),
+        ).lastrowid
+        connection.executemany(
+            'INSERT INTO bench_item (order_id, product_id, unit_price) VALUES (?, ?, ?)',
+            [(order_id, rng.randrange(1000), 100) for _ in range(3)],
+        )
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность читателей и писателей SQLite: прежние настройки против WAL и PRAGMA'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Потоков-читателей')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков-писателей')
+        parser.add_argument('--seconds', type=float, default=5, help='Длительность прогона на профиль')
+        parser.add_argument('--orders', type=int, default=20000, help='Заказов в исходных данных')
+        parser.add_argument('--profiles', default='default,tuned', help='Профили через запятую: ' + ', '.join(PROFILES))
+
+    def prepare(self, path, profile, orders):
+        connection = sqlite3.connect(path, isolation_level=None)
+        for name, value in profile['pragmas'].items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        connection.executescript(SCHEMA)
+        rng = random.Random(0)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO bench_order (id, user_id, delivery_address, created_at, total) VALUES (?, ?, ?, ?, ?)',
+            [(index, rng.randrange(100), 'Seed street', index, 300) for index in range(1, orders + 1)],
+        )
+        connection.executemany(
+            'INSERT INTO bench_item (order_id, product_id, unit_price) VALUES (?, ?, ?)',
+            [(index, rng.randrange(1000), 100) for index in range(1, orders + 1) for _ in range(3)],
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run_profile(self, directory, name, options):
+        profile = PROFILES[name]
+        path = os.path.join(directory, f'{name}.sqlite3')
+        self.prepare(path, profile, options['orders'])
+
+        deadline = time.monotonic() + options['seconds']
+        readers = [Worker(path, profile, read, deadline) for _ in range(options['readers'])]
+        writers = [Worker(path, profile, write, deadline) for _ in range(options['writers'])]
+        for worker in readers + writers:
+            worker.start()
+        for worker in readers + writers:
+            worker.join()
+
+        seconds = options['seconds']
+        return (
+            sum(worker.done for worker in readers) / seconds,
+            sum(worker.done for worker in writers) / seconds,
+            sum(worker.errors for worker in readers + writers),
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='sqlite-benchmark-')
+        try:
+            self.stdout.write(
+                f"{options['readers']} readers, {options['writers']} writers, {options['seconds']:g} s per profile"
+            )
+            self.stdout.write(f"{'profile':>10} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+            for name in options['profiles'].split(','):
+                reads, writes, errors = self.run_profile(directory, name.strip(), options)
+                self.stdout.write(f'{name:>10} {reads:>10.0f} {writes:>10.0f} {errors:>8}')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
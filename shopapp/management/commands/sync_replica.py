@@ -0,0 +1,42 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from myfirstproject.replicas import replica_config
+
+
+def copy_database(source, target):
+    """
+    Копия SQLite через backup API за один шаг: снимок источника
+    согласован, а читатели реплики до конца копирования видят прежние данные.
+    """
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплику для отчётов (REPLICA в settings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; не больше REPLICA["SYNC_INTERVAL"]',
+        )
+
+    def handle(self, *args, **options):
+        alias = replica_config()['ALIAS']
+        if alias is None:
+            raise CommandError('Реплика не настроена: задайте DJANGO_DB_REPLICA')
+
+        source = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        target = str(connections[alias].settings_dict['NAME'])
+        while True:
+            started = time.monotonic()
+            copy_database(source, target)
+            self.stdout.write(f'{target}: {(time.monotonic() - started) * 1000:.0f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0003_alter_order_options_alter_product_options_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "csv_file",
+                    models.FileField(upload_to="imports/", verbose_name="CSV file"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "total_rows",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Total rows"
+                    ),
+                ),
+                (
+                    "rows_processed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Rows processed"
+                    ),
+                ),
+                (
+                    "created_orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Created orders"
+                    ),
+                ),
+                (
+                    "errors_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Errors count"),
+                ),
+                (
+                    "errors",
+                    models.JSONField(blank=True, default=list, verbose_name="Errors"),
+                ),
+                ("failure", models.TextField(blank=True, verbose_name="Failure")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated at"),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Created by",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Order import job",
+                "verbose_name_plural": "Order import jobs",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Order = apps.get_model("shopapp", "Order")
+    Product = apps.get_model("shopapp", "Product")
+    links = Order.products.through.objects
+
+    orders_links = (
+        links.filter(order_id=OuterRef("pk"))
+        .values("order_id")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Order.objects.update(
+        cached_products_count=Coalesce(Subquery(orders_links), Value(0))
+    )
+
+    products_links = (
+        links.filter(product_id=OuterRef("pk"))
+        .values("product_id")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Product.objects.update(
+        cached_orders_count=Coalesce(Subquery(products_links), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0004_orderimportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cached_products_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Products count"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="cached_orders_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Orders count"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:48
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_items(apps, schema_editor):
+    Order = apps.get_model("shopapp", "Order")
+    OrderItem = apps.get_model("shopapp", "OrderItem")
+    links = Order.products.through.objects.values_list(
+        "order_id", "product_id", "product__price", "product__discount"
+    )
+
+    items = []
+    totals = {}
+    for order_id, product_id, price, discount in links.iterator():
+        items.append(
+            OrderItem(
+                order_id=order_id,
+                product_id=product_id,
+                unit_price=price,
+                discount=discount,
+            )
+        )
+        line = (price * (100 - discount) / 100).quantize(Decimal("0.01"))
+        totals[order_id] = totals.get(order_id, Decimal("0")) + line
+
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    Order.objects.bulk_update(
+        [Order(pk=pk, total=total) for pk, total in totals.items()],
+        ["total"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0005_denormalized_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Total",
+            ),
+        ),
+        migrations.CreateModel(
+            name="OrderItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=1, verbose_name="Quantity"),
+                ),
+                (
+                    "unit_price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=8, verbose_name="Unit price"
+                    ),
+                ),
+                (
+                    "discount",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Discount"
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="shopapp.order",
+                        verbose_name="Order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_items",
+                        to="shopapp.product",
+                        verbose_name="Product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Order item",
+                "verbose_name_plural": "Order items",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("order", "product"), name="unique_order_item_product"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_items, migrations.RunPython.noop),
+    ]
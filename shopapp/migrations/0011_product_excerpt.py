@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+EXCERPT_WORDS = 20
+
+
+def fill_excerpts(apps, schema_editor):
+    Product = apps.get_model('shopapp', 'Product')
+    batch = []
+    for product in Product.objects.only('pk', 'description').iterator(chunk_size=1000):
+        product.excerpt = Truncator(product.description).words(EXCERPT_WORDS, truncate=' …')
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    Product.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0010_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False, verbose_name="Excerpt"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["archived", "name", "id"], name="product_archived_name_id_idx"),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0011_product_excerpt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderimportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Heartbeat at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderimportjob",
+            name="owner",
+            field=models.CharField(
+                blank=True, editable=False, max_length=32, verbose_name="Owner"
+            ),
+        ),
+    ]
@@ -1,14 +1,29 @@
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils.text import Truncator
 from django.utils.translation import gettext_lazy as _
 
+EXCERPT_WORDS = 20
+
+# Разделитель названий в first_product_names (char(31) в shopapp.summaries)
+NAME_SEPARATOR = '\x1f'
+
+
+def make_excerpt(description):
+    """Начало описания для карточки в каталоге, как truncatewords"""
+    return Truncator(description).words(EXCERPT_WORDS, truncate=" …")
+
 
 class Product(models.Model):
     name = models.CharField(max_length=100, verbose_name=_("Name"))
     description = models.TextField(blank=True, verbose_name=_("Description"))
+    excerpt = models.TextField(blank=True, editable=False, verbose_name=_("Excerpt"))
     price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name=_("Price"))
     discount = models.PositiveSmallIntegerField(default=0, verbose_name=_("Discount"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
     archived = models.BooleanField(default=False, verbose_name=_("Archived"))
     created_by = models.ForeignKey(
         User,
@@ -18,6 +33,11 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    cached_orders_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Orders count")
+    )
 
     class Meta:
         verbose_name = _("Product")
@@ -26,10 +46,26 @@ class Product(models.Model):
         permissions = [
             ("can_create_product", _("Can create product")),
         ]
+        indexes = [
+            models.Index(fields=["archived", "price"], name="product_archived_price_idx"),
+            models.Index(fields=["archived", "discount"], name="product_archived_discount_idx"),
+            models.Index(fields=["archived", "created_at"], name="product_archived_created_idx"),
+            models.Index(fields=["created_by", "archived"], name="product_creator_archived_idx"),
+            models.Index(fields=["archived", "name", "id"], name="product_archived_name_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.price}₽"
 
+    def save(self, *args, **kwargs):
+        """Каталог выводит excerpt, чтобы не читать полное описание"""
+        if "description" not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.description)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "description" in update_fields:
+                kwargs["update_fields"] = {*update_fields, "excerpt"}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return f"/shop/products/{self.pk}/"
 
@@ -38,17 +74,80 @@ class Order(models.Model):
     delivery_address = models.TextField(verbose_name=_("Delivery address"))
     promocode = models.CharField(max_length=20, blank=True, verbose_name=_("Promo code"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
     user = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name=_("User"))
     products = models.ManyToManyField(Product, related_name="orders", verbose_name=_("Products"))
+    cached_products_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Products count")
+    )
+    total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name=_("Total")
+    )
 
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Orders")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="order_created_at_id_idx"),
+        ]
 
     def __str__(self):
         return f"Order #{self.pk} from {self.user.username}"
 
+    @property
+    def first_products(self):
+        """Первые названия из аннотации with_product_summary()"""
+        return self.first_product_names.split(NAME_SEPARATOR) if self.first_product_names else []
+
+    @property
+    def more_products(self):
+        return self.products_count - len(self.first_products)
+
+
+class OrderItem(models.Model):
+    """Позиция заказа: цена и скидка фиксируются на момент покупки"""
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name=_("Order")
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='order_items',
+        verbose_name=_("Product")
+    )
+    quantity = models.PositiveIntegerField(default=1, verbose_name=_("Quantity"))
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name=_("Unit price"))
+    discount = models.PositiveSmallIntegerField(default=0, verbose_name=_("Discount"))
+
+    class Meta:
+        verbose_name = _("Order item")
+        verbose_name_plural = _("Order items")
+        constraints = [
+            models.UniqueConstraint(fields=["order", "product"], name="unique_order_item_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity}"
+
+    @property
+    def line_total(self):
+        return line_total(self.unit_price, self.quantity, self.discount)
+
+
+def line_total(unit_price, quantity, discount):
+    """Стоимость позиции со скидкой, округлённая до копеек"""
+    return (unit_price * quantity * (100 - discount) / 100).quantize(Decimal("0.01"))
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -62,4 +161,55 @@ class ProductImage(models.Model):
 
     class Meta:
         verbose_name = _("Product image")
-        verbose_name_plural = _("Product images")
\ No newline at end of file
+        verbose_name_plural = _("Product images")
+
+
+class OrderImportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    ]
+
+    csv_file = models.FileField(upload_to='imports/', verbose_name=_("CSV file"))
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name=_("Status")
+    )
+    total_rows = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Total rows"))
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name=_("Rows processed"))
+    created_orders = models.PositiveIntegerField(default=0, verbose_name=_("Created orders"))
+    errors_count = models.PositiveIntegerField(default=0, verbose_name=_("Errors count"))
+    errors = models.JSONField(default=list, blank=True, verbose_name=_("Errors"))
+    failure = models.TextField(blank=True, verbose_name=_("Failure"))
+    # Исполнитель, захвативший задачу, и время его последней пачки
+    owner = models.CharField(max_length=32, blank=True, editable=False, verbose_name=_("Owner"))
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name=_("Heartbeat at"))
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_("Created by")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
+
+    class Meta:
+        verbose_name = _("Order import job")
+        verbose_name_plural = _("Order import jobs")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
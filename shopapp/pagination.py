@@ -0,0 +1,192 @@
+import base64
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация заказов по (created_at, id).
+
+    Без COUNT(*) и OFFSET: любая страница стоит столько же, сколько первая.
+    Сортировка фиксирована, ?ordering в этом режиме не применяется.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class NoCountPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация без COUNT(*).
+
+    Выбирается на одну строку больше размера страницы, чтобы понять,
+    есть ли следующая; в ответе нет поля count.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and self.page_number > 1:
+            raise NotFound(self.invalid_page_message)
+        self.has_next = len(rows) > page_size
+        self.request = request
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._page_link(self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        if self.page_number == 2:
+            return remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return self._page_link(self.page_number - 1)
+
+    def _page_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, page_number)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].pop('count', None)
+        response_schema['required'] = ['results']
+        return response_schema
+
+
+def _cursor_value(value):
+    """Даты - полным isoformat: DjangoJSONEncoder отрезает микросекунды, и курсор сбивался бы"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {value!r} in a cursor')
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_cursor_value).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """ValueError на любой испорченный курсор"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f'Invalid cursor {cursor!r}') from exc
+    if not isinstance(values, list):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    return values
+
+
+def after_condition(fields, values):
+    """
+    Строки после (v1, v2, ...) в сортировке fields; "-поле" - по убыванию.
+
+    Условие f1 >= v1 (или <=) впереди даёт SQLite начало диапазона в индексе.
+    """
+    names = [field.lstrip('-') for field in fields]
+    condition = Q()
+    for index, field in enumerate(fields):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = dict(zip(names[:index], values))
+        condition |= Q(**equal, **{f'{names[index]}__{lookup}': values[index]})
+    first_bound = 'lte' if fields[0].startswith('-') else 'gte'
+    return Q(**{f'{names[0]}__{first_bound}': values[0]}) & condition
+
+
+class KeysetPage:
+    """
+    Страница выборки по ключу сортировки для «показать ещё».
+
+    Следующая страница начинается после последней строки текущей, поэтому
+    не нужны ни OFFSET, ни COUNT(*): любая страница стоит как первая.
+    Строки читаются при первом обращении: если шаблон взял список из кеша
+    фрагмента, запроса нет.
+    """
+
+    def __init__(self, queryset, fields, cursor=None, size=20):
+        queryset = queryset.order_by(*fields)
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(fields):
+                raise ValueError(f'Invalid cursor {cursor!r}')
+            queryset = queryset.filter(after_condition(fields, values))
+        self.queryset = queryset
+        self.fields = fields
+        self.size = size
+        self._rows = None
+
+    def _fetch(self):
+        if self._rows is None:
+            self._rows = list(self.queryset[:self.size + 1])
+        return self._rows
+
+    @property
+    def object_list(self):
+        return self._fetch()[:self.size]
+
+    @property
+    def has_next(self):
+        return len(self._fetch()) > self.size
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor([getattr(last, field.lstrip('-')) for field in self.fields])
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """ListView: страницы по ключу keyset_fields и курсору ?after= вместо ?page="""
+    keyset_fields = ('pk',)
+    cursor_query_param = 'after'
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = KeysetPage(queryset, self.keyset_fields, self.request.GET.get(self.cursor_query_param), page_size)
+        except ValueError:
+            raise Http404(_("Invalid cursor"))
+        # Сама страница вместо списка строк: ListView не читает её раньше шаблона
+        return None, page, page, SimpleLazyObject(lambda: page.has_next)
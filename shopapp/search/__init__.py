@@ -0,0 +1,60 @@
+"""
+Полнотекстовый поиск товаров.
+
+Бэкенд задаётся настройкой SHOPAPP_SEARCH_BACKEND; по умолчанию на SQLite
+используется индекс FTS5, на остальных базах - поиск через icontains.
+Индекс обновляется сигналами при сохранении и удалении товара,
+полная перестройка - командой rebuild_search_index.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from ..models import Product
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SHOPAPP_SEARCH_BACKEND', None)
+        if path is None:
+            if connection.vendor == 'sqlite':
+                path = 'shopapp.search.backends.SQLiteFTSBackend'
+            else:
+                path = 'shopapp.search.backends.DatabaseSearchBackend'
+        _backend = import_string(path)()
+    return _backend
+
+
+def search_products(queryset, query, rank=True):
+    """Фильтрует queryset товаров по запросу; rank=True добавляет аннотацию search_rank"""
+    return get_backend().search(queryset, query, rank=rank)
+
+
+def rebuild_index(batch_size=1000):
+    backend = get_backend()
+    products = Product.objects.only('pk', 'name', 'description').order_by('pk')
+    backend.rebuild([])
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        backend.index(batch)
+        last_pk = batch[-1].pk
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
@@ -0,0 +1,109 @@
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .stemming import tokenize
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс поискового индекса товаров.
+
+    search() фильтрует переданный queryset и, если rank=True, добавляет
+    аннотацию search_rank: чем меньше значение, тем выше товар в выдаче.
+    """
+
+    def index(self, products):
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def rebuild(self, products):
+        raise NotImplementedError
+
+    def search(self, queryset, query, rank=True):
+        raise NotImplementedError
+
+    def no_rank(self, queryset, rank):
+        if not rank:
+            return queryset
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Запасной вариант без индекса: icontains по названию и описанию"""
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self, products):
+        pass
+
+    def search(self, queryset, query, rank=True):
+        for term in query.split():
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return self.no_rank(queryset, rank)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Инвертированный индекс на SQLite FTS5.
+
+    В таблицу пишутся уже простемленные слова, rowid совпадает с id товара.
+    Каждое слово запроса ищется как префикс, ранжирование - bm25
+    с весом названия выше описания.
+    """
+    table = 'shopapp_product_fts'
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def index(self, products):
+        rows = [
+            (product.pk, ' '.join(tokenize(product.name)), ' '.join(tokenize(product.description)))
+            for product in products
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self, products):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        self.index(products)
+
+    def build_match(self, query):
+        terms = [f'"{term}"*' for term in dict.fromkeys(tokenize(query))]
+        return ' '.join(terms)
+
+    def search(self, queryset, query, rank=True):
+        match = self.build_match(query)
+        if not match:
+            return self.no_rank(queryset, rank)
+
+        matched = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        queryset = queryset.filter(pk__in=matched)
+        if not rank:
+            return queryset
+
+        product_table = queryset.model._meta.db_table
+        search_rank = RawSQL(
+            f'SELECT bm25({self.table}, %s, %s) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = "{product_table}"."id"',
+            [self.name_weight, self.description_weight, match],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=search_rank)
+
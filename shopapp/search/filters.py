@@ -0,0 +1,22 @@
+from rest_framework.filters import SearchFilter
+
+from . import search_products
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    ?search через поисковый индекс вместо LIKE по search_fields.
+
+    Если клиент не передал ?ordering, выдача сортируется по релевантности,
+    поэтому фильтр должен стоять после OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        queryset = search_products(queryset, query)
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('search_rank', 'pk')
+        return queryset
@@ -0,0 +1,97 @@
+"""
+Лёгкие стеммеры для языков из settings.LANGUAGES (ru, en).
+
+Русский - портированный алгоритм Портера, английский - упрощённый Портер
+(окончания множественного числа, -ed, -ing, -ly). Одинаковое приведение
+текста при индексации и при поиске важнее лингвистической точности.
+"""
+import re
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+RU_PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+RU_REFLEXIVE = re.compile(r'(с[яь])$')
+RU_ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+RU_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+RU_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+RU_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+RU_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+RU_DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+RU_DER = re.compile(r'ость?$')
+RU_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+EN_VOWEL = re.compile(r'[aeiouy]')
+
+
+def stem_russian(word):
+    match = RU_RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+
+    temp = RU_PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = RU_REFLEXIVE.sub('', rv, 1)
+        temp = RU_ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = RU_PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = RU_VERB.sub('', rv, 1)
+            rv = RU_NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+
+    rv = re.sub('и$', '', rv, 1)
+    if RU_DERIVATIONAL.match(rv):
+        rv = RU_DER.sub('', rv, 1)
+
+    temp = re.sub('ь$', '', rv, 1)
+    if temp == rv:
+        rv = RU_SUPERLATIVE.sub('', rv, 1)
+        rv = re.sub('нн$', 'н', rv, 1)
+    else:
+        rv = temp
+
+    return start + rv
+
+
+def stem_english(word):
+    if len(word) <= 3:
+        return word
+
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss') and not word.endswith('us'):
+        word = word[:-1]
+
+    for suffix in ('ingly', 'edly', 'ing', 'ed', 'ly'):
+        if word.endswith(suffix) and EN_VOWEL.search(word[:-len(suffix)]):
+            word = word[:-len(suffix)]
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+
+    if word.endswith('y') and len(word) > 2 and not EN_VOWEL.match(word[-2]):
+        word = word[:-1] + 'i'
+
+    return word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if CYRILLIC_RE.search(word):
+        return stem_russian(word)
+    return stem_english(word)
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре и со стеммингом"""
+    return [stem(token) for token in TOKEN_RE.findall(text or '')]
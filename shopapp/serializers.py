@@ -27,4 +27,83 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at',
             'user',
             'products',
-        ]
\ No newline at end of file
+            'total',
+        ]
+
+
+class FastProductSerializer:
+    """
+    Быстрое чтение продуктов для списков API.
+
+    Строки берутся через values_list() только по запрошенным колонкам,
+    а превращение строки в словарь собирается один раз на набор полей.
+    Формат значений совпадает с ProductSerializer: преобразования берутся
+    из его полей, но применяются только там, где они что-то меняют.
+    """
+    converted_fields = (serializers.DateTimeField, serializers.DecimalField)
+    expandable = {
+        'created_by': ('created_by_id', 'created_by__username'),
+    }
+    _compiled = {}
+
+    def __init__(self, fields=None, expand=()):
+        all_fields = ProductSerializer.Meta.fields
+        unknown = [name for name in fields or () if name not in all_fields]
+        unknown += [name for name in expand if name not in self.expandable]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+        # Поля в порядке ProductSerializer и без повторов: ключей кеша
+        # не больше, чем подмножеств полей, как бы ни был записан ?fields
+        self.fields = tuple(name for name in all_fields if not fields or name in fields)
+        self.expand = tuple(name for name in self.expandable if name in expand and name in self.fields)
+
+        key = (self.fields, self.expand)
+        if key not in self._compiled:
+            self._compiled[key] = self.compile()
+        self.columns, self.to_dict = self._compiled[key]
+
+    @classmethod
+    def from_request(cls, request):
+        """?fields=name,price и ?expand=created_by"""
+        fields = [name for name in request.query_params.get('fields', '').split(',') if name]
+        expand = [name for name in request.query_params.get('expand', '').split(',') if name]
+        return cls(fields=fields, expand=expand)
+
+    def compile(self):
+        serializer_fields = ProductSerializer().fields
+        columns = []
+        plan = []
+
+        for name in self.fields:
+            if name in self.expand:
+                id_column, username_column = self.expandable[name]
+                plan.append((name, len(columns), 'expand'))
+                columns += [id_column, username_column]
+                continue
+
+            field = serializer_fields[name]
+            converter = field.to_representation if isinstance(field, self.converted_fields) else None
+            plan.append((name, len(columns), converter))
+            columns.append(field.source if field.source != '*' else name)
+
+        plan = tuple(plan)
+
+        def to_dict(row):
+            data = {}
+            for name, index, converter in plan:
+                value = row[index]
+                if converter == 'expand':
+                    value = {'id': value, 'username': row[index + 1]} if value is not None else None
+                elif converter is not None and value is not None:
+                    value = converter(value)
+                data[name] = value
+            return data
+
+        return tuple(columns), to_dict
+
+    def values(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, rows):
+        to_dict = self.to_dict
+        return [to_dict(row) for row in rows]
@@ -10,7 +10,7 @@ class ShopSitemap(Sitemap):
         return Product.objects.filter(archived=False)
 
     def lastmod(self, obj):
-        return obj.created_at
+        return obj.updated_at
 
     def location(self, obj):
         return f"/shop/products/{obj.pk}/"
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Сводка состава заказа для списков без загрузки товаров.
+
+Число товаров и первые названия по алфавиту считаются коррелированными
+подзапросами в той же выборке заказов: вместо prefetch всех товаров
+каждого заказа на страницу приходит по две колонки на строку.
+"""
+from django.db.models import CharField, F, OuterRef, Subquery
+
+from .counters import counters_enabled, links_count
+from .models import Product
+
+
+class ProductNames(Subquery):
+    """
+    Первые limit названий товаров заказа одной строкой (GROUP_CONCAT в SQLite);
+    Order.first_products разбивает её по models.NAME_SEPARATOR.
+    """
+    template = "(SELECT GROUP_CONCAT(name, char(31)) FROM (%(subquery)s))"
+    output_field = CharField()
+
+    def __init__(self, limit, **extra):
+        names = Product.objects.filter(orders=OuterRef('pk')).order_by('name', 'pk').values('name')[:limit]
+        super().__init__(names, **extra)
+
+
+def with_product_summary(orders, names=3):
+    """Аннотирует products_count и first_product_names; сумма - сохранённый Order.total"""
+    products_count = F('cached_products_count') if counters_enabled() else links_count('order_id')
+    return orders.annotate(products_count=products_count, first_product_names=ProductNames(names))
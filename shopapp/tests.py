@@ -1,10 +1,36 @@
-from django.test import TestCase
+from django.test import Client, SimpleTestCase, TestCase, override_settings
 from django.contrib.auth.models import User, Permission
 from django.urls import reverse
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import Group
+import csv
+import gzip
+import io
 import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-from .models import Product, Order
+from . import views
+from .models import Product, Order, OrderImportJob
+from .importers import OrderCSVImporter
+from .jobs import JobLost, JobOrderImporter, claim_job, run_import_job
+from .cache import TieredCache, user_orders_cache, user_orders_export_key
+from .counters import refresh_counters
+from .serializers import FastProductSerializer, ProductSerializer
+from .management.commands.sync_replica import copy_database
+from myfirstproject.testing import QueryCeilingMixin
 
 
 class OrderDetailViewTestCase(TestCase):
@@ -84,6 +110,7 @@ class OrdersExportTestCase(TestCase):
 
     def setUp(self):
         """Логинимся перед каждым тестом"""
+        cache.clear()
         self.client.login(username='staffuser', password='staffpass123')
 
     def test_orders_export(self):
@@ -130,6 +157,84 @@ class OrdersExportTestCase(TestCase):
             self.assertIsInstance(first_order['user_id'], int)
             self.assertIsInstance(first_order['product_ids'], list)
 
+    def test_orders_export_ndjson(self):
+        """Тест потокового экспорта заказов в NDJSON"""
+        url = reverse('shopapp:orders_export')
+
+        response = self.client.get(url, {'format': 'ndjson'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        exported = [json.loads(line) for line in lines]
+
+        expected = [
+            {
+                'id': order.pk,
+                'delivery_address': order.delivery_address,
+                'promocode': order.promocode,
+                'created_at': order.created_at.isoformat(),
+                'user_id': order.user_id,
+                'total': str(order.total),
+                'product_ids': sorted(order.products.values_list('pk', flat=True)),
+            }
+            for order in Order.objects.order_by('pk')
+        ]
+        self.assertEqual(exported, expected)
+
+    def test_orders_export_json_stream(self):
+        """Тест потокового экспорта заказов в JSON-массив"""
+        url = reverse('shopapp:orders_export')
+
+        response = self.client.get(url, {'format': 'json'})
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            [order['id'] for order in response_data['orders']],
+            list(Order.objects.order_by('pk').values_list('pk', flat=True))
+        )
+
+    def test_products_export_csv_gzip(self):
+        """Тест экспорта продуктов в CSV со сжатием"""
+        url = reverse('shopapp:products_export')
+
+        response = self.client.get(url, {'format': 'csv', 'compress': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(
+            [int(row['id']) for row in rows],
+            list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        )
+        product = Product.objects.get(pk=rows[0]['id'])
+        self.assertEqual(rows[0]['price'], str(product.price))
+
+    def test_products_export_columnar(self):
+        """Тест колоночного экспорта продуктов"""
+        url = reverse('shopapp:products_export')
+
+        response = self.client.get(url, {'format': 'columnar'})
+
+        response_data = json.loads(b''.join(response.streaming_content))
+        columns = response_data['columns']
+        names = [
+            name
+            for batch in response_data['batches']
+            for name in batch[columns.index('name')]
+        ]
+        self.assertEqual(names, list(Product.objects.order_by('pk').values_list('name', flat=True)))
+
+    def test_export_unknown_format(self):
+        """Тест неизвестного формата экспорта"""
+        response = self.client.get(reverse('shopapp:products_export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
     def test_orders_export_requires_staff(self):
         """Тест, что обычный пользователь не может экспортировать"""
         regular_user = User.objects.create_user(
@@ -144,4 +249,1112 @@ class OrdersExportTestCase(TestCase):
 
         self.assertEqual(response.status_code, 403)
 
-        regular_user.delete()
\ No newline at end of file
+        regular_user.delete()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class OrderCSVImportTestCase(TestCase):
+    """Тесты пакетного импорта заказов из CSV"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            password='adminpass123',
+            email='admin@example.com'
+        )
+        self.client.login(username='admin', password='adminpass123')
+
+    def make_csv(self, rows):
+        lines = ['delivery_address,promocode,user_id,product_ids']
+        lines += rows
+        return SimpleUploadedFile('orders.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+
+    def test_import_csv(self):
+        """Тест импорта через админку, включая строки с ошибками"""
+        csv_file = self.make_csv([
+            '"Address 1",SALE,100,"100,101"',
+            '"Address 2",,101,"102,999"',
+            '"Address 3",,999,"100"',
+            ',,100,"100"',
+        ])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('admin:shopapp_order_import_csv'), {'csv_file': csv_file})
+
+        job = OrderImportJob.objects.get()
+        self.assertRedirects(response, reverse('admin:shopapp_order_import_csv_status', kwargs={'job_id': job.pk}))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Order.objects.count(), 0)
+
+        run_import_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, OrderImportJob.STATUS_DONE)
+        self.assertEqual(job.total_rows, 4)
+        self.assertEqual(job.rows_processed, 4)
+        self.assertEqual(job.created_orders, 2)
+        self.assertEqual(job.errors_count, 3)
+        self.assertEqual(Order.objects.count(), 2)
+
+        first = Order.objects.get(delivery_address='Address 1')
+        self.assertEqual(first.promocode, 'SALE')
+        self.assertEqual(first.user_id, 100)
+        self.assertEqual(sorted(first.products.values_list('pk', flat=True)), [100, 101])
+
+        second = Order.objects.get(delivery_address='Address 2')
+        self.assertEqual(list(second.products.values_list('pk', flat=True)), [102])
+
+        response = self.client.get(reverse('admin:shopapp_order_import_csv_progress', kwargs={'job_id': job.pk}))
+        self.assertEqual(json.loads(response.content)['rows_processed'], 4)
+
+    def test_import_job_resumes_from_checkpoint(self):
+        """Импорт продолжается со строки, сохранённой в задаче"""
+        job = OrderImportJob.objects.create(
+            csv_file=self.make_csv([
+                '"Address 1",,100,"100"',
+                '"Address 2",,100,"101"',
+                '"Address 3",,101,"102"',
+            ]),
+            status=OrderImportJob.STATUS_RUNNING,
+            rows_processed=2,
+        )
+
+        run_import_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, OrderImportJob.STATUS_DONE)
+        self.assertEqual(job.rows_processed, 3)
+        self.assertEqual(job.created_orders, 1)
+        self.assertEqual(list(Order.objects.values_list('delivery_address', flat=True)), ['Address 3'])
+
+    def test_running_job_is_not_claimed_twice(self):
+        """Живую задачу второй исполнитель не берёт, брошенную - продолжает"""
+        job = OrderImportJob.objects.create(
+            csv_file=self.make_csv(['"Address 1",,100,"100"']),
+            status=OrderImportJob.STATUS_RUNNING,
+            owner='web-worker',
+            heartbeat_at=timezone.now(),
+        )
+
+        run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, OrderImportJob.STATUS_RUNNING)
+        self.assertEqual(Order.objects.count(), 0)
+
+        OrderImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, OrderImportJob.STATUS_DONE)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_batch_is_rolled_back_after_takeover(self):
+        """Пачка прежнего исполнителя не коммитится после перехвата задачи"""
+        job = OrderImportJob.objects.create(csv_file=self.make_csv(['"Address 1",,100,"100"']))
+        stale_owner = claim_job(job.pk)
+        OrderImportJob.objects.filter(pk=job.pk).update(owner='other-runner')
+
+        importer = JobOrderImporter(job, stale_owner)
+        with self.assertRaises(JobLost):
+            importer.import_rows([{'delivery_address': 'Address 1', 'user_id': '100', 'product_ids': '100'}])
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertIsNone(claim_job(job.pk))
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        """Число запросов зависит от числа пачек, а не строк"""
+        importer = OrderCSVImporter(batch_size=100)
+
+        with CaptureQueriesContext(connection) as small:
+            importer.import_rows([
+                {'delivery_address': 'Address', 'user_id': '100', 'product_ids': '100,101'}
+            ] * 2)
+
+        with CaptureQueriesContext(connection) as large:
+            importer.import_rows([
+                {'delivery_address': 'Address', 'user_id': '100', 'product_ids': '100,101'}
+            ] * 50)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(importer.created, 52)
+        self.assertEqual(importer.errors, [])
+
+
+class ChangelistCountsTestCase(TestCase):
+    """Тесты количества связей в списках админки"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+        'orders-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            password='adminpass123',
+            email='admin@example.com'
+        )
+        self.client.login(username='admin', password='adminpass123')
+
+    def test_changelist_counts_are_annotated(self):
+        """Количество заказов и товаров считается в том же запросе, что и список"""
+        response = self.client.get(reverse('admin:shopapp_product_changelist'), {'o': '6'})
+        self.assertEqual(response.status_code, 200)
+        counts = {product.pk: product._orders_count for product in response.context['cl'].result_list}
+        self.assertEqual(counts, {100: 1, 101: 2, 102: 2})
+
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('admin:shopapp_order_changelist'))
+        for index in range(5):
+            Order.objects.create(user_id=100, delivery_address=f'Extra {index}').products.add(100, 101, 102)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(reverse('admin:shopapp_order_changelist'))
+
+        self.assertEqual(len(before), len(after))
+        self.assertContains(response, '<td class="field-products_count">3</td>', count=5, html=True)
+
+    @override_settings(SHOPAPP_DENORMALIZED_COUNTERS=True)
+    def test_denormalized_counters_follow_m2m_changes(self):
+        """Счётчики обновляются при изменении связей"""
+        refresh_counters()
+        order = Order.objects.get(pk=100)
+        product = Product.objects.get(pk=102)
+
+        order.products.add(product)
+        product.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(order.cached_products_count, 3)
+        self.assertEqual(product.cached_orders_count, 3)
+
+        product.orders.clear()
+        product.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(product.cached_orders_count, 0)
+        self.assertEqual(order.cached_products_count, 2)
+
+        Order.objects.get(pk=101).delete()
+        self.assertEqual(Product.objects.get(pk=101).cached_orders_count, 1)
+
+
+class OrderTotalTestCase(TestCase):
+    """Тесты позиций заказа и сохранённой суммы"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def test_total_uses_price_snapshot(self):
+        """Сумма считается по цене на момент покупки и не меняется вместе с товаром"""
+        order = Order.objects.create(user_id=100, delivery_address='Address')
+        order.products.add(100, 102)
+
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('899.99') + Decimal('2549.99'))
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'unit_price', 'discount')),
+            [(100, Decimal('999.99'), 10), (102, Decimal('2999.99'), 15)]
+        )
+
+        Product.objects.filter(pk=100).update(price=1)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('3449.98'))
+
+        order.products.remove(102)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('899.99'))
+
+        item = order.items.get()
+        item.quantity = 3
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('2699.97'))
+
+        order.products.clear()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('0'))
+        self.assertFalse(order.items.exists())
+
+    def test_bulk_import_fills_items_and_total(self):
+        """Пакетный импорт сразу создаёт позиции и сумму"""
+        importer = OrderCSVImporter()
+        importer.import_rows([{'delivery_address': 'Address', 'user_id': '100', 'product_ids': '100,101'}])
+
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal('899.99') + Decimal('1999.99'))
+        self.assertEqual(order.items.count(), 2)
+
+
+class OrderAdminInlineTestCase(TestCase):
+    """Правка состава заказа инлайном админки, минуя m2m_changed"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+        'orders-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        user_orders_cache.clear_local()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_login(self.admin)
+
+    def export(self):
+        response = self.client.get(reverse('shopapp:user_orders_export', kwargs={'user_id': 100}))
+        return {order['id']: sorted(p['id'] for p in order['products']) for order in response.json()}
+
+    def save_inline(self, rows):
+        """Форма заказа 100; rows - {pk строки связи или None: product_id или None для удаления}"""
+        data = {
+            'user': 100,
+            'delivery_address': 'Fixture Address 1, Moscow',
+            'promocode': 'FIXTURE10',
+            'Order_products-TOTAL_FORMS': len(rows),
+            'Order_products-INITIAL_FORMS': sum(pk is not None for pk in rows),
+            'Order_products-MIN_NUM_FORMS': 0,
+            'Order_products-MAX_NUM_FORMS': 1000,
+        }
+        for index, (pk, product_id) in enumerate(rows.items()):
+            prefix = f'Order_products-{index}-'
+            data[prefix + 'order'] = 100
+            if pk is not None:
+                data[prefix + 'id'] = pk
+            if product_id is None:
+                data[prefix + 'DELETE'] = 'on'
+                product_id = Order.products.through.objects.get(pk=pk).product_id
+            data[prefix + 'product'] = product_id
+        response = self.client.post(reverse('admin:shopapp_order_change', args=[100]), data)
+        self.assertEqual(response.status_code, 302)
+        return Order.objects.get(pk=100)
+
+    @override_settings(SHOPAPP_DENORMALIZED_COUNTERS=True)
+    def test_inline_updates_items_counters_and_export_cache(self):
+        refresh_counters()
+        self.assertEqual(self.export()[100], [100, 101])
+        first, second = Order.products.through.objects.filter(order_id=100).order_by('product_id')
+
+        # Первую строку удаляем, во второй меняем товар
+        order = self.save_inline({first.pk: None, second.pk: 102})
+        self.assertEqual(list(order.items.values_list('product_id', flat=True)), [102])
+        self.assertEqual(order.total, Decimal('2549.99'))
+        self.assertEqual(order.cached_products_count, 1)
+        self.assertEqual(Product.objects.get(pk=100).cached_orders_count, 0)
+        self.assertEqual(Product.objects.get(pk=101).cached_orders_count, 1)
+        self.assertEqual(Product.objects.get(pk=102).cached_orders_count, 3)
+        self.assertEqual(self.export()[100], [102])
+
+        order = self.save_inline({second.pk: 102, None: 101})
+        self.assertEqual(sorted(order.items.values_list('product_id', flat=True)), [101, 102])
+        self.assertEqual(order.total, Decimal('1999.99') + Decimal('2549.99'))
+        self.assertEqual(order.cached_products_count, 2)
+        self.assertEqual(Product.objects.get(pk=101).cached_orders_count, 2)
+        self.assertEqual(self.export()[100], [101, 102])
+
+
+class OrderApiPaginationTestCase(TestCase):
+    """Тесты пагинации API заказов"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='apiuser', password='apipass123')
+        self.client.login(username='apiuser', password='apipass123')
+        for index in range(25):
+            Order.objects.create(user_id=100, delivery_address=f'Address {index}').products.add(100, 101)
+
+    def test_cursor_pagination_walks_all_orders(self):
+        """Курсор проходит все заказы без count и с постоянным числом запросов"""
+        url = reverse('shopapp:api:order-list')
+        seen = []
+        query_counts = []
+
+        params = {'pagination': 'cursor', 'page_size': 10}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            query_counts.append(len(queries))
+            data = response.json()
+            self.assertNotIn('count', data)
+            seen.extend(order['id'] for order in data['results'])
+            url, params = data['next'], None
+
+        self.assertEqual(seen, list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+        self.assertEqual(len(set(query_counts)), 1)
+        self.assertEqual(data['results'][0]['products'], [100, 101])
+
+    def test_nocount_pagination(self):
+        """Страницы без COUNT(*)"""
+        response = self.client.get(reverse('shopapp:api:order-list'), {'pagination': 'nocount', 'page': 2})
+        data = response.json()
+
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+        self.assertEqual(len(data['results']), 5)
+
+        response = self.client.get(reverse('shopapp:api:order-list'), {'pagination': 'nocount', 'page': 3})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductApiReadTestCase(TestCase):
+    """Тесты быстрого чтения продуктов через API"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='apiuser', password='apipass123')
+        self.client.login(username='apiuser', password='apipass123')
+
+    def test_list_matches_model_serializer(self):
+        """Без параметров ответ совпадает с ProductSerializer"""
+        response = self.client.get(reverse('shopapp:api:product-list'))
+
+        expected = ProductSerializer(Product.objects.order_by('name'), many=True).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+        response = self.client.get(reverse('shopapp:api:product-detail', kwargs={'pk': 101}))
+        self.assertEqual(response.json(), json.loads(json.dumps(ProductSerializer(Product.objects.get(pk=101)).data)))
+
+    def test_sparse_fieldset_narrows_query(self):
+        """?fields выбирает только нужные колонки"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shopapp:api:product-list'), {'fields': 'name,price'})
+
+        self.assertEqual(response.json()['results'][0], {'name': 'Fixture Product 1', 'price': '999.99'})
+        select = [query['sql'] for query in queries.captured_queries if 'shopapp_product' in query['sql']][-1]
+        self.assertNotIn('description', select)
+
+    def test_expand_created_by(self):
+        """?expand=created_by отдаёт автора без дополнительных запросов"""
+        response = self.client.get(reverse('shopapp:api:product-list'), {'fields': 'id,created_by', 'expand': 'created_by'})
+
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': 100, 'created_by': {'id': 100, 'username': 'fixture_user1'}}
+        )
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('shopapp:api:product-list'), {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_field_sets_share_compiled_reader(self):
+        """Повторы и порядок в ?fields не плодят записи в кеше сериализаторов"""
+        readers = [FastProductSerializer(fields=fields) for fields in (
+            ['name', 'price'], ['price', 'name'], ['name', 'name', 'price'], ['price', 'price', 'name', 'name'],
+        )]
+        self.assertEqual({reader.fields for reader in readers}, {('name', 'price')})
+        self.assertEqual(len({reader.to_dict for reader in readers}), 1)
+
+    def test_retrieve_invalid_id(self):
+        response = self.client.get(reverse('shopapp:api:product-detail', kwargs={'pk': 'abc'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTestCase(TestCase):
+    """Тесты полнотекстового поиска товаров"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.login(username='admin', password='adminpass123')
+        self.laptop = Product.objects.create(name='Ноутбук', description='Мощный ноутбук для работы', price=75000)
+        self.phone = Product.objects.create(name='Смартфон', description='Смартфон с отличной камерой', price=45000)
+        self.headphones = Product.objects.create(
+            name='Wireless headphones', description='Headphones for a laptop', price=15000
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('shopapp:api:product-list'), {'search': query, 'fields': 'id'})
+        return [product['id'] for product in response.json()['results']]
+
+    def test_stemming_and_prefix(self):
+        """Словоформы и префиксы находят товар"""
+        self.assertEqual(self.search('ноутбуки'), [self.laptop.pk])
+        self.assertEqual(self.search('мощные ноут'), [self.laptop.pk])
+        self.assertEqual(self.search('камерами'), [self.phone.pk])
+        self.assertEqual(self.search('headphone'), [self.headphones.pk])
+        self.assertEqual(self.search('утбук'), [])
+
+    def test_ranking_prefers_name(self):
+        """Совпадение в названии выше, чем в описании"""
+        notebook = Product.objects.create(name='Сумка', description='Сумка для ноутбука', price=1000)
+        self.assertEqual(self.search('ноутбук'), [self.laptop.pk, notebook.pk])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при сохранении и удалении"""
+        self.phone.name = 'Планшет'
+        self.phone.description = ''
+        self.phone.save()
+        self.assertEqual(self.search('смартфон'), [])
+        self.assertEqual(self.search('планшеты'), [self.phone.pk])
+
+        pk = self.laptop.pk
+        self.laptop.delete()
+        self.assertEqual(self.search('ноутбук'), [])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM shopapp_product_fts WHERE rowid = %s', [pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_admin_search(self):
+        """Поиск в админке идёт по индексу и по цене"""
+        url = reverse('admin:shopapp_product_changelist')
+
+        response = self.client.get(url, {'q': 'ноутбуки'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.laptop])
+
+        response = self.client.get(url, {'q': '45000'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.phone])
+
+
+class ProductFacetsTestCase(TestCase):
+    """Тесты фильтров и фасетов каталога"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='apiuser', password='apipass123')
+        self.client.login(username='apiuser', password='apipass123')
+        Product.objects.create(name='Archived', price=25000, discount=40, archived=True)
+
+    def get(self, params):
+        response = self.client.get(reverse('shopapp:api:product-list'), {'fields': 'id', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_range_filters(self):
+        """Диапазоны цены и скидки, архивность"""
+        data = self.get({'price__gte': 1000, 'price__lte': 3000})
+        self.assertEqual([row['id'] for row in data['results']], [101, 102])
+
+        data = self.get({'discount__gte': 10, 'archived': 'false'})
+        self.assertEqual([row['id'] for row in data['results']], [100, 102])
+
+    def test_facets_ignore_own_group(self):
+        """Группа считается без своих фильтров, но с остальными"""
+        data = self.get({'price__gte': 1000, 'archived': 'false', 'facets': 'price,discount,archived'})
+
+        price = {bucket['key']: bucket['count'] for bucket in data['facets']['price']}
+        self.assertEqual(price, {'0-1000': 1, '1000-5000': 2, '5000-20000': 0, '20000+': 0})
+
+        discount = {bucket['key']: bucket['count'] for bucket in data['facets']['discount']}
+        self.assertEqual(discount, {'0': 1, '1-9': 0, '10-29': 1, '30+': 0})
+
+        self.assertEqual(data['facets']['archived'], [
+            {'value': False, 'count': 2},
+            {'value': True, 'count': 1},
+        ])
+        self.assertEqual(data['count'], 2)
+
+    def test_one_query_per_facet_group(self):
+        url = reverse('shopapp:api:product-list')
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url, {'fields': 'id'})
+        cache.clear()
+        with CaptureQueriesContext(connection) as faceted:
+            self.client.get(url, {'fields': 'id', 'facets': 'price,discount,created_at,created_by'})
+
+        self.assertEqual(len(faceted) - len(plain), 4)
+
+    def test_unknown_facet(self):
+        response = self.client.get(reverse('shopapp:api:product-list'), {'facets': 'price,colour'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_list_view(self):
+        """HTML-список фильтрует и показывает счётчики"""
+        response = self.client.get(reverse('shopapp:products_list'), {'price__lt': 2500})
+
+        self.assertEqual([product.pk for product in response.context['products']], [100, 101])
+        self.assertEqual(response.context['facets']['price'][3]['count'], 0)
+        self.assertContains(response, '1000-5000 ₽</a> (2)')
+
+
+class UserOrdersExportCacheTestCase(TestCase):
+    """Тесты сброса кеша выгрузки заказов пользователя"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+        'orders-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        user_orders_cache.clear_local()
+        self.user = User.objects.create_user(username='viewer', password='viewerpass123')
+        self.client.login(username='viewer', password='viewerpass123')
+        self.export(100)
+        self.export(101)
+
+    def export(self, user_id):
+        response = self.client.get(reverse('shopapp:user_orders_export', kwargs={'user_id': user_id}))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def cached(self, user_id):
+        return cache.get(user_orders_export_key(user_id)) is not None
+
+    def test_product_change_invalidates_only_affected_owners(self):
+        product = Product.objects.get(pk=100)
+        product.name = 'Renamed'
+        product.save()
+
+        self.assertFalse(self.cached(100))
+        self.assertTrue(self.cached(101))
+        self.assertIn('Renamed', [product['name'] for product in self.export(100)[0]['products']])
+
+    def test_unrelated_product_fields_keep_cache(self):
+        Product.objects.get(pk=100).save(update_fields=['archived'])
+        self.assertTrue(self.cached(100))
+
+    def test_order_changes(self):
+        """Состав заказа и смена владельца сбрасывают нужные записи"""
+        Order.objects.get(pk=101).products.remove(102)
+        self.assertFalse(self.cached(101))
+        self.assertTrue(self.cached(100))
+        self.assertEqual([p['id'] for p in self.export(101)[0]['products']], [101])
+
+        order = Order.objects.get(pk=102)
+        order.user_id = 101
+        order.save()
+        self.assertFalse(self.cached(100))
+        self.assertFalse(self.cached(101))
+
+    def test_reverse_clear_and_product_delete(self):
+        Product.objects.get(pk=102).orders.clear()
+        self.assertFalse(self.cached(100))
+        self.assertFalse(self.cached(101))
+
+        self.export(100)
+        self.export(101)
+        Order.objects.get(pk=102).products.set([])
+        self.export(100)
+        Product.objects.get(pk=100).delete()
+        self.assertFalse(self.cached(100))
+        self.assertTrue(self.cached(101))
+
+    def test_export_built_before_commit_is_not_cached(self):
+        """Выгрузка, собранная до коммита записи, не остаётся в кеше после её сброса"""
+        cache.clear()
+        user_orders_cache.clear_local()
+        build = views.build_user_orders_export
+
+        def build_during_write(user_id):
+            data = build(user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.get(pk=100)
+                product.name = 'Renamed'
+                product.save()
+            return data
+
+        with mock.patch.object(views, 'build_user_orders_export', build_during_write):
+            stale = self.export(100)
+        self.assertNotIn('Renamed', [product['name'] for product in stale[0]['products']])
+        self.assertFalse(self.cached(100))
+        self.assertIn('Renamed', [product['name'] for product in self.export(100)[0]['products']])
+
+    def test_empty_export_is_cached(self):
+        self.export(self.user.pk)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.export(self.user.pk), [])
+
+
+class TieredCacheTestCase(SimpleTestCase):
+    """Тесты двухуровневого кеша"""
+
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache(local_timeout=60, stale_timeout=60, wait_timeout=2)
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0):
+        def build():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return build
+
+    def test_single_flight(self):
+        """Параллельные промахи пересчитывает один поток"""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.tiered.get_or_set('hot', self.compute(delay=0.2), 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_local_tier(self):
+        self.tiered.get_or_set('key', self.compute('first'), 60)
+        cache.delete('key')
+        self.assertEqual(self.tiered.get_or_set('key', self.compute('second'), 60), 'first')
+
+        self.tiered.delete_many(['key'])
+        self.assertEqual(self.tiered.get_or_set('key', self.compute('second'), 60), 'second')
+
+    def test_delete_during_compute_discards_value(self):
+        """Сброс во время расчёта: значение отдаётся, но не кешируется"""
+        def build():
+            self.tiered.delete_many(['key'])
+            return 'before write'
+
+        self.assertEqual(self.tiered.get_or_set('key', build, 60), 'before write')
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(self.tiered.get_or_set('key', self.compute(), 60), 'fresh')
+        self.assertEqual(self.tiered.get_or_set('key', self.compute('second'), 60), 'fresh')
+
+    def test_stale_while_revalidate(self):
+        """Пока другой воркер пересчитывает, отдаётся устаревшее значение"""
+        cache.set('key', ('stale', time.time() - 1, 0.1), 60)
+        cache.add('key:lock', 'other-worker', 30)
+        self.assertEqual(self.tiered.get_or_set('key', self.compute(), 60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('key:lock')
+        self.tiered.clear_local()
+        self.assertEqual(self.tiered.get_or_set('key', self.compute(), 60), 'fresh')
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_early_refresh(self):
+        """Долгий расчёт у конца срока обновляется заранее"""
+        cache.set('key', ('old', time.time() + 1, 10 ** 6), 60)
+        self.assertEqual(self.tiered.get_or_set('key', self.compute(), 60), 'fresh')
+
+        cache.set('other', ('old', time.time() + 1000, 0.001), 60)
+        self.assertEqual(self.tiered.get_or_set('other', self.compute(), 60), 'old')
+
+
+class FragmentCacheTestCase(TestCase):
+    """Тесты кеша фрагментов со штампами версий"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+        'orders-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.login(username='admin', password='adminpass123')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_product_detail_fragment(self):
+        url = reverse('shopapp:product_detail', kwargs={'pk': 100})
+        response, cold = self.count_queries(url)
+        response, warm = self.count_queries(url)
+        self.assertLess(warm, cold)
+        self.assertContains(response, 'Test product from fixture')
+
+        product = Product.objects.get(pk=100)
+        product.description = 'Updated description'
+        product.save()
+        response, _ = self.count_queries(url)
+        self.assertContains(response, 'Updated description')
+
+    def test_product_list_fragment_skips_list_and_facets(self):
+        url = reverse('shopapp:products_list')
+        _, cold = self.count_queries(url)
+        response, warm = self.count_queries(url)
+        self.assertLess(warm, cold)
+        self.assertContains(response, 'Fixture Product 1')
+
+        response, _ = self.count_queries(url + '?price__gte=1000')
+        self.assertNotContains(response, 'Fixture Product 1')
+
+        Product.objects.filter(pk=100).update(archived=True)
+        response, _ = self.count_queries(url)
+        self.assertNotContains(response, 'Fixture Product 1')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), warm)
+        # Строки страницы не читаются, пока фрагмент берётся из кеша
+        list_selects = [query for query in queries.captured_queries if '"shopapp_product"."excerpt"' in query['sql']]
+        self.assertEqual(list_selects, [])
+
+    def test_order_list_follows_product_and_total_changes(self):
+        url = reverse('shopapp:orders_list')
+        _, cold = self.count_queries(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertLess(len(queries), cold)
+        # При попадании в кеш фрагмента заказы и подзапросы состава не читаются
+        self.assertEqual([query for query in queries.captured_queries if 'GROUP_CONCAT' in query['sql']], [])
+
+        product = Product.objects.get(pk=100)
+        product.name = 'Renamed product'
+        product.save()
+        response, _ = self.count_queries(url)
+        self.assertContains(response, 'Renamed product')
+
+        Order.objects.get(pk=102).products.add(100)
+        response, _ = self.count_queries(url)
+        self.assertEqual(Order.objects.get(pk=102).total, Decimal('3449.98'))
+        self.assertContains(response, '3449,98')
+
+    def test_user_header_is_not_cached(self):
+        """Шапка с пользователем рендерится отдельно от фрагментов"""
+        url = reverse('shopapp:product_detail', kwargs={'pk': 100})
+        self.client.get(url)
+
+        other = User.objects.create_user(username='other', password='otherpass123')
+        self.client.login(username='other', password='otherpass123')
+        response = self.client.get(url)
+        self.assertContains(response, reverse('shopapp:user_orders', kwargs={'user_id': other.pk}))
+        self.assertNotContains(response, reverse('shopapp:product_update', kwargs={'pk': 100}))
+
+
+class ConditionalGetTestCase(TestCase):
+    """Тесты ETag / Last-Modified и ответов 304"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='apiuser', password='apipass123')
+        self.client.login(username='apiuser', password='apipass123')
+
+    def assertNotModified(self, url, **headers):
+        """Повтор с валидатором даёт 304 без чтения строк товаров"""
+        # Первый ответ ставит cookie CSRF, от которой зависит ETag HTML-страниц
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.get(url, headers={
+                'if-none-match': response['ETag'],
+                **headers,
+            })
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated.content, b'')
+        product_selects = [
+            query['sql'] for query in queries.captured_queries
+            if '"shopapp_product"."description"' in query['sql']
+        ]
+        self.assertEqual(product_selects, [])
+        return response
+
+    def test_shop_views(self):
+        self.assertNotModified(reverse('shopapp:product_detail', kwargs={'pk': 100}))
+        self.assertNotModified(reverse('shopapp:products_list'))
+        self.assertNotModified(reverse('shopapp:products_feed'))
+        self.assertNotModified(reverse('django.contrib.sitemaps.views.sitemap'))
+
+    def test_api(self):
+        response = self.assertNotModified(reverse('shopapp:api:product-list') + '?price__gte=1000')
+        other = self.client.get(reverse('shopapp:api:product-list') + '?price__gte=2000')
+        self.assertNotEqual(response['ETag'], other['ETag'])
+
+        self.assertNotModified(reverse('shopapp:api:product-detail', kwargs={'pk': 101}))
+
+        missing = self.client.get(reverse('shopapp:api:product-detail', kwargs={'pk': 999}))
+        self.assertEqual(missing.status_code, 404)
+        self.assertFalse(missing.has_header('ETag'))
+
+    def test_change_refreshes_validators(self):
+        url = reverse('shopapp:api:product-list')
+        etag = self.client.get(url)['ETag']
+
+        product = Product.objects.get(pk=100)
+        product.price = 10
+        product.save()
+
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_admin_archive_action_refreshes_validators(self):
+        """Архивация из админки меняет ETag, Last-Modified и фрагмент карточки"""
+        page = reverse('shopapp:product_detail', kwargs={'pk': 100})
+        api = reverse('shopapp:api:product-detail', kwargs={'pk': 100})
+        self.client.get(page)
+        validators = {url: self.client.get(url) for url in (page, api)}
+
+        admin = Client()
+        admin.force_login(User.objects.create_superuser(username='admin', password='adminpass123'))
+        admin.post(reverse('admin:shopapp_product_changelist'), {
+            'action': 'mark_archived',
+            '_selected_action': [100],
+        })
+
+        responses = {
+            url: self.client.get(url, headers={
+                'if-none-match': response['ETag'],
+                'if-modified-since': response['Last-Modified'],
+            })
+            for url, response in validators.items()
+        }
+        self.assertEqual([response.status_code for response in responses.values()], [200, 200])
+        self.assertTrue(responses[api].json()['archived'])
+        self.assertContains(responses[page], 'color: red')
+
+    def test_if_modified_since(self):
+        url = reverse('shopapp:product_detail', kwargs={'pk': 100})
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, headers={'if-modified-since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_viewer(self):
+        url = reverse('shopapp:product_detail', kwargs={'pk': 100})
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_etag_depends_on_csrf_token(self):
+        """Страница с формой смены языка не отдаётся 304 со старым токеном"""
+        self.client.logout()
+        url = reverse('shopapp:products_list')
+        self.client.cookies['csrftoken'] = 'a' * 32
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+        self.client.cookies['csrftoken'] = 'b' * 32
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ProductCatalogPaginationTestCase(TestCase):
+    """Тесты страниц каталога по курсору и сохранённого excerpt"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.bulk_create([
+            Product(name='Same name', description='x', price=Decimal('10.00'))
+            for _ in range(30)
+        ])
+
+    def test_load_more_walks_catalog(self):
+        url = reverse('shopapp:products_list')
+        seen = []
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(product.pk for product in response.context['products'])
+            page = response.context['page_obj']
+            if not page.has_next:
+                self.assertNotContains(response, 'load-more"')
+                break
+            self.assertContains(response, 'class="btn load-more"')
+            response = self.client.get(url, {'after': page.next_cursor})
+
+        expected = list(Product.objects.filter(archived=False).order_by('name', 'pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_description_is_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shopapp:products_list'))
+        self.assertContains(response, 'Test product from fixture')
+        product_selects = [query['sql'] for query in queries.captured_queries if '"shopapp_product"."excerpt"' in query['sql']]
+        self.assertEqual(len(product_selects), 1)
+        self.assertNotIn('"shopapp_product"."description"', product_selects[0])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('shopapp:products_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_excerpt_follows_description(self):
+        product = Product.objects.get(pk=100)
+        product.description = ' '.join(f'word{index}' for index in range(30))
+        product.save(update_fields=['description'])
+
+        product.refresh_from_db()
+        self.assertTrue(product.excerpt.startswith('word0 word1'))
+        self.assertTrue(product.excerpt.endswith('word19 …'))
+
+
+class OrderListSummaryTestCase(TestCase):
+    """Тесты страниц списка заказов и сводки по товарам"""
+
+    fixtures = [
+        'users-fixtures.json',
+        'products-fixtures.json',
+        'orders-fixtures.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_summary_without_products_prefetch(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shopapp:orders_list'))
+
+        orders = {order.pk: order for order in response.context['orders']}
+        self.assertEqual(orders[101].products_count, 2)
+        self.assertEqual(orders[101].first_products, ['Fixture Product 2', 'Fixture Product 3'])
+        self.assertEqual(orders[101].total, Order.objects.get(pk=101).total)
+        self.assertNotIn(
+            '"shopapp_order"."delivery_address"',
+            ' '.join(query['sql'] for query in queries.captured_queries),
+        )
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT ("shopapp_order_products"."order_id")')
+        ])
+
+    @override_settings(SHOPAPP_DENORMALIZED_COUNTERS=True)
+    def test_summary_uses_counters(self):
+        refresh_counters()
+        Order.objects.get(pk=100).products.add(102)
+        response = self.client.get(reverse('shopapp:orders_list'))
+        orders = {order.pk: order for order in response.context['orders']}
+        self.assertEqual(orders[100].products_count, 3)
+        self.assertEqual(len(orders[100].first_products), 3)
+
+    def test_pages_follow_created_at(self):
+        products = [*Product.objects.all(), Product.objects.create(name='Extra product', price=Decimal('1.00'))]
+        for index in range(60):
+            Order.objects.create(user_id=100, delivery_address=f'Extra {index}').products.add(*products)
+        Order.objects.filter(delivery_address__startswith='Extra').update(created_at=Order.objects.get(pk=100).created_at)
+
+        url = reverse('shopapp:orders_list')
+        response = self.client.get(url)
+        first_page = [order.pk for order in response.context['orders']]
+        self.assertEqual(len(first_page), 50)
+        self.assertContains(response, 'and 1 more')
+
+        cursor = response.context['page_obj'].next_cursor
+        rest = [order.pk for order in self.client.get(url, {'after': cursor}).context['orders']]
+
+        expected = list(Order.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(first_page + rest, expected)
+
+
+class QueryCeilingTestCase(QueryCeilingMixin, TestCase):
+    """Число запросов view не растёт с числом товаров и заказов"""
+
+    def setUp(self):
+        cache.clear()
+        user_orders_cache.clear_local()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_login(self.admin)
+        self.buyers = User.objects.bulk_create([User(username=f'buyer{index}') for index in range(10)])
+
+    def reset_caches(self):
+        """bulk_create не шлёт сигналов, которые сбросили бы кеши"""
+        cache.clear()
+        user_orders_cache.clear_local()
+
+    def populate_products(self, rows):
+        existing = Product.objects.count()
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {index}',
+                description='Описание товара ' * 10,
+                price=Decimal(100 + index),
+                discount=index % 20,
+                created_by=self.buyers[index % len(self.buyers)],
+            )
+            for index in range(existing, rows)
+        ])
+        self.reset_caches()
+
+    def populate_orders(self, rows):
+        self.populate_products(10)
+        products = list(Product.objects.values_list('pk', flat=True)[:10])
+        existing = Order.objects.count()
+        orders = Order.objects.bulk_create([
+            Order(delivery_address=f'Address {index}', user=self.buyers[index % len(self.buyers)])
+            for index in range(existing, rows)
+        ])
+        Order.products.through.objects.bulk_create([
+            Order.products.through(order_id=order.pk, product_id=products[(order.pk + offset) % len(products)])
+            for order in orders
+            for offset in range(3)
+        ])
+        self.reset_caches()
+
+    def get(self, name, **kwargs):
+        return lambda: self.client.get(reverse(name, kwargs=kwargs or None))
+
+    def test_product_views(self):
+        self.assertQueryCeiling(10, self.get('shopapp:products_list'), self.populate_products)
+        self.assertQueryCeiling(5, self.get('shopapp:api:product-list'), self.populate_products)
+
+    def test_order_views(self):
+        self.assertQueryCeiling(5, self.get('shopapp:orders_list'), self.populate_orders)
+        self.assertQueryCeiling(4, self.get('shopapp:orders_export'), self.populate_orders)
+        self.assertQueryCeiling(
+            5, self.get('shopapp:user_orders_export', user_id=self.buyers[0].pk), self.populate_orders,
+        )
+        self.assertQueryCeiling(6, self.get('admin:shopapp_order_changelist'), self.populate_orders)
+
+
+class ReplicaCommandsTestCase(TestCase):
+    """Тесты sync_replica и export_data"""
+    fixtures = ['users-fixtures.json', 'products-fixtures.json', 'orders-fixtures.json']
+
+    def test_copy_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source, target = os.path.join(directory, 'db.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+            db.executemany('INSERT INTO item VALUES (?)', [(1,), (2,)])
+        copy_database(source, target)
+        with sqlite3.connect(source) as db:
+            db.execute('INSERT INTO item VALUES (3)')
+        copy_database(source, target)
+
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(replica.execute('SELECT COUNT(*) FROM item').fetchone(), (3,))
+
+    def test_sync_replica_requires_alias(self):
+        with self.assertRaisesMessage(CommandError, 'DJANGO_DB_REPLICA'):
+            call_command('sync_replica', stdout=io.StringIO())
+
+    def test_export_data(self):
+        out = io.StringIO()
+        call_command('export_data', 'orders', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [100, 101, 102])
+        self.assertEqual(rows[0]['product_ids'], [100, 101])
@@ -0,0 +1,91 @@
+"""
+Позиции заказа и сохранённая сумма Order.total.
+
+Связь Order.products остаётся основной точкой входа для форм и админки:
+при её изменении здесь создаются или удаляются OrderItem со снимком
+текущей цены и скидки товара, а сумма заказа пересчитывается.
+"""
+from decimal import Decimal
+
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Product, Order, OrderItem, line_total
+
+
+def build_items(order_id, products):
+    """OrderItem со снимком цены для пар (pk, price, discount)"""
+    return [
+        OrderItem(order_id=order_id, product_id=pk, unit_price=price, discount=discount)
+        for pk, price, discount in products
+    ]
+
+
+def refresh_totals(order_ids):
+    """
+    Пересчитывает Order.total по позициям; один SELECT и один UPDATE на пачку заказов.
+
+    bulk_update не трогает auto_now, поэтому updated_at (штамп версии
+    для кеша фрагментов) выставляется явно.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+
+    now = timezone.now()
+    totals = dict.fromkeys(order_ids, Decimal('0'))
+    items = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'unit_price', 'quantity', 'discount'
+    )
+    for order_id, unit_price, quantity, discount in items:
+        totals[order_id] += line_total(unit_price, quantity, discount)
+
+    Order.objects.bulk_update(
+        [Order(pk=order_id, total=total, updated_at=now) for order_id, total in totals.items()],
+        ['total', 'updated_at'],
+    )
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def sync_order_items(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_order_ids = list(instance.orders.values_list('pk', flat=True))
+        return
+
+    if action == 'post_add':
+        if reverse:
+            product = (instance.pk, instance.price, instance.discount)
+            OrderItem.objects.bulk_create(
+                [item for order_id in pk_set for item in build_items(order_id, [product])],
+                ignore_conflicts=True,
+            )
+            refresh_totals(pk_set)
+        else:
+            products = Product.objects.filter(pk__in=pk_set).values_list('pk', 'price', 'discount')
+            OrderItem.objects.bulk_create(build_items(instance.pk, products), ignore_conflicts=True)
+            refresh_totals([instance.pk])
+
+    elif action == 'post_remove':
+        if reverse:
+            OrderItem.objects.filter(product=instance, order_id__in=pk_set).delete()
+            refresh_totals(pk_set)
+        else:
+            OrderItem.objects.filter(order=instance, product_id__in=pk_set).delete()
+            refresh_totals([instance.pk])
+
+    elif action == 'post_clear':
+        if reverse:
+            OrderItem.objects.filter(product=instance).delete()
+            refresh_totals(getattr(instance, '_cleared_order_ids', []))
+        else:
+            OrderItem.objects.filter(order=instance).delete()
+            refresh_totals([instance.pk])
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    """Правка позиции в админке или коде тоже обновляет сумму"""
+    refresh_totals([instance.order_id])
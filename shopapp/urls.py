@@ -14,6 +14,7 @@ urlpatterns = [
     path('', views.shop_index, name='index'),
 
     path('products/', views.ProductListView.as_view(), name='products_list'),
+    path('products/export/', views.ProductsExportView.as_view(), name='products_export'),
     path('products/create/', views.ProductCreateView.as_view(), name='product_create'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('products/<int:pk>/update/', views.ProductUpdateView.as_view(), name='product_update'),
@@ -31,5 +32,5 @@ urlpatterns = [
 
     path('products/latest/feed/', LatestProductsFeed(), name='products_feed'),
 
-    path('api/', include(router.urls)),
+    path('api/', include((router.urls, 'api'))),
 ]
\ No newline at end of file
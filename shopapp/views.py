@@ -8,10 +8,22 @@ from django.views.generic import (
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
 from django.contrib.auth.models import User
 from django.http import HttpResponseRedirect, JsonResponse
-from django.core.cache import cache
+from django.views.decorators.cache import never_cache
 from django.core import serializers
-from .models import Product, Order
+from django.db.models import Prefetch
+from .models import Product, Order, OrderItem
 from .forms import ProductForm, OrderForm
+from .cache import queryset_version, user_orders_cache, user_orders_export_key, user_orders_export_timeout
+from .conditional import (
+    catalog_validators, conditional_view, product_detail_validators, product_list_validators,
+)
+from .exports import FORMATS, OrderExporter, ProductExporter, export_response
+from .filters import ProductFilter, product_facets
+from .pagination import KeysetPaginationMixin
+from .summaries import with_product_summary
+from myfirstproject.replicas import replica_timeout, replica_view
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import gettext_lazy as _
 from django.contrib.syndication.views import Feed
 import json
@@ -29,16 +41,39 @@ def shop_index(request):
     return render(request, 'shopapp/shop_index.html', context)
 
 
-class ProductListView(ListView):
-    """Отображение списка продуктов"""
+@method_decorator(conditional_view(product_list_validators), name='get')
+class ProductListView(KeysetPaginationMixin, ListView):
+    """
+    Отображение списка продуктов с фильтрами и счётчиками фасетов.
+
+    Страницы идут по ключу (name, pk) через ?after=<курсор>: кнопка
+    «Показать ещё» дописывает следующую страницу к списку. Полное описание
+    не читается, карточка выводит сохранённый excerpt.
+    """
     model = Product
     template_name = 'shopapp/product_list.html'
     context_object_name = 'products'
+    paginate_by = 24
+    keyset_fields = ('name', 'pk')
+    query_budget = 12
+    facet_groups = ('price', 'discount', 'created_at', 'created_by')
 
     def get_queryset(self):
-        return Product.objects.filter(archived=False)
+        self.filterset = ProductFilter(self.request.GET, queryset=Product.objects.filter(archived=False))
+        return self.filterset.qs.select_related('created_by').defer('description')
+
+    def get_context_data(self, **kwargs):
+        """Список, форма и фасеты лениво считаются только при промахе кеша фрагмента"""
+        context = super().get_context_data(**kwargs)
+        context['filter'] = self.filterset
+        context['facets'] = SimpleLazyObject(
+            lambda: product_facets(self.request.GET, self.filterset.queryset, self.facet_groups)
+        )
+        context['catalog_version'] = queryset_version(self.filterset.queryset)
+        return context
 
 
+@method_decorator(conditional_view(product_detail_validators), name='get')
 class ProductDetailView(DetailView):
     """Отображение деталей продукта"""
     model = Product
@@ -103,14 +138,34 @@ class ProductArchiveView(View):
         return HttpResponseRedirect(reverse('shopapp:products_list'))
 
 
-class OrderListView(ListView):
-    """Отображение списка заказов"""
+class OrderListView(KeysetPaginationMixin, ListView):
+    """
+    Отображение списка заказов, новые сверху, страницами по курсору.
+
+    Читаются только нужные шаблону колонки; состав заказа - число товаров
+    и первые названия - приходит подзапросами в той же выборке.
+    """
     model = Order
     template_name = 'shopapp/order_list.html'
     context_object_name = 'orders'
+    paginate_by = 50
+    keyset_fields = ('-created_at', '-pk')
+    summary_names = 3
+    query_budget = 8
 
     def get_queryset(self):
-        return Order.objects.select_related('user').prefetch_related('products')
+        orders = Order.objects.select_related('user').only(
+            'created_at', 'total', 'user__username', 'user__first_name', 'user__last_name',
+        )
+        return with_product_summary(orders, self.summary_names)
+
+    def get_context_data(self, **kwargs):
+        """Страница заказов читается только при промахе кеша фрагмента"""
+        context = super().get_context_data(**kwargs)
+        context['orders_version'] = (
+            f"{queryset_version(Order.objects.all())}-{queryset_version(Product.objects.all())}"
+        )
+        return context
 
 
 class OrderDetailView(DetailView):
@@ -120,7 +175,9 @@ class OrderDetailView(DetailView):
     context_object_name = 'order'
 
     def get_queryset(self):
-        return Order.objects.select_related('user').prefetch_related('products')
+        return Order.objects.select_related('user').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('product__name'))
+        )
 
 
 class OrderCreateView(CreateView):
@@ -148,15 +205,48 @@ class OrderDeleteView(DeleteView):
     success_url = reverse_lazy('shopapp:orders_list')
 
 
-class OrdersExportView(UserPassesTestMixin, View):
-    """Экспорт заказов в JSON"""
+@method_decorator(replica_view, name='dispatch')
+class ExportView(UserPassesTestMixin, View):
+    """
+    Потоковая выгрузка модели для staff.
+
+    ?format=json|ndjson|csv|columnar выбирает формат,
+    ?compress=gzip сжимает ответ на лету. Читает с реплики.
+    """
+    exporter_class = None
 
     def test_func(self):
         """Проверка доступа - только для staff"""
         return self.request.user.is_staff
 
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'json')
+        if export_format not in FORMATS:
+            return JsonResponse({'error': f'Unknown export format: {export_format}'}, status=400)
+
+        compress = request.GET.get('compress') == 'gzip'
+        return export_response(self.exporter_class(), export_format, compress=compress)
+
+
+class ProductsExportView(ExportView):
+    """Экспорт продуктов"""
+    exporter_class = ProductExporter
+
+
+class OrdersExportView(ExportView):
+    """
+    Экспорт заказов.
+
+    Без ?format возвращает прежний JSON {"orders": [...]} одним ответом.
+    """
+    exporter_class = OrderExporter
+    query_budget = 6
+
     def get(self, request, *args, **kwargs):
         """Возвращает JSON со всеми заказами"""
+        if 'format' in request.GET:
+            return super().get(request, *args, **kwargs)
+
         orders = Order.objects.select_related('user').prefetch_related('products').all()
         orders_data = []
         for order in orders:
@@ -165,7 +255,7 @@ class OrdersExportView(UserPassesTestMixin, View):
                 'delivery_address': order.delivery_address,
                 'promocode': order.promocode,
                 'user_id': order.user.pk,
-                'product_ids': list(order.products.values_list('pk', flat=True))
+                'product_ids': [product.pk for product in order.products.all()]
             })
         return JsonResponse({
             'orders': orders_data
@@ -188,17 +278,29 @@ class UserOrdersListView(LoginRequiredMixin, ListView):
         return context
 
 
+@never_cache
+@replica_view
 def user_orders_export(request, user_id):
-    """Экспорт заказов пользователя в JSON с низкоуровневым кешированием"""
+    """
+    Экспорт заказов пользователя в JSON.
+
+    Кеш сбрасывают сигналы из shopapp.cache, поэтому HTTP-кеширование
+    ответа отключено: браузер и прокси отдавали бы данные мимо сброса.
+    Строится по реплике; автор нового заказа закреплён за default,
+    а собранное по реплике живёт в кеше не дольше её интервала синхронизации.
+    """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
 
-    cache_key = f"user_orders_export_{user_id}"
+    orders_data = user_orders_cache.get_or_set(
+        user_orders_export_key(user_id),
+        lambda: build_user_orders_export(user_id),
+        replica_timeout(user_orders_export_timeout()),
+    )
+    return JsonResponse(orders_data, safe=False)
 
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return JsonResponse(cached_data, safe=False)
 
+def build_user_orders_export(user_id):
     owner = get_object_or_404(User, pk=user_id)
     orders = Order.objects.filter(user=owner).select_related('user').prefetch_related('products').order_by('pk')
 
@@ -209,6 +311,7 @@ def user_orders_export(request, user_id):
             'delivery_address': order.delivery_address,
             'promocode': order.promocode,
             'created_at': order.created_at.isoformat(),
+            'total': str(order.total),
             'user': {
                 'id': order.user.pk,
                 'username': order.user.username,
@@ -226,10 +329,7 @@ def user_orders_export(request, user_id):
             ]
         }
         orders_data.append(order_data)
-
-    cache.set(cache_key, orders_data, 300)
-
-    return JsonResponse(orders_data, safe=False)
+    return orders_data
 
 
 class LatestProductsFeed(Feed):
@@ -237,6 +337,11 @@ class LatestProductsFeed(Feed):
     link = reverse_lazy("shopapp:products_list")
     description = "Новые товары в нашем магазине"
 
+    @method_decorator(replica_view)
+    @method_decorator(conditional_view(catalog_validators))
+    def __call__(self, request, *args, **kwargs):
+        return super().__call__(request, *args, **kwargs)
+
     def items(self):
         return Product.objects.filter(archived=False).order_by('-created_at')[:10]
 
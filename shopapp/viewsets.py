@@ -1,14 +1,32 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Prefetch
 from rest_framework import viewsets, filters
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from .conditional import conditional_response, queryset_validators
+from .filters import FACETS, ProductFilter, product_facets
 from .models import Product, Order
-from .serializers import ProductSerializer, OrderSerializer
+from .pagination import NoCountPageNumberPagination, OrderCursorPagination
+from .search import search_products
+from .search.filters import ProductSearchFilter
+from .serializers import ProductSerializer, OrderSerializer, FastProductSerializer
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="Получить список продуктов",
-        description="Возвращает список всех продуктов с возможностью поиска и сортировки"
+        description="Возвращает список всех продуктов с возможностью поиска, фильтрации и сортировки",
+        parameters=[
+            OpenApiParameter('fields', str, description="Поля через запятую, например name,price"),
+            OpenApiParameter('expand', str, enum=['created_by'], description="Раскрыть автора: id и username"),
+            OpenApiParameter(
+                'facets',
+                str,
+                description="Группы фасетов через запятую: " + ', '.join(FACETS),
+            ),
+        ],
     ),
     create=extend_schema(
         summary="Создать новый продукт",
@@ -16,7 +34,11 @@ from .serializers import ProductSerializer, OrderSerializer
     ),
     retrieve=extend_schema(
         summary="Получить продукт по ID",
-        description="Возвращает детальную информацию о продукте"
+        description="Возвращает детальную информацию о продукте",
+        parameters=[
+            OpenApiParameter('fields', str, description="Поля через запятую, например name,price"),
+            OpenApiParameter('expand', str, enum=['created_by'], description="Раскрыть автора: id и username"),
+        ],
     ),
     update=extend_schema(
         summary="Обновить продукт",
@@ -36,22 +58,99 @@ class ProductViewSet(viewsets.ModelViewSet):
     ViewSet для работы с продуктами.
 
     Поддерживает:
-    - Поиск по названию и описанию
+    - Полнотекстовый поиск по названию и описанию с ранжированием
+    - Фильтрацию по диапазонам цены, скидки и даты, архивности и автору
+    - Счётчики фасетов (?facets=price,discount)
     - Сортировку по названию, цене и дате создания
+    - Выбор полей (?fields=name,price) и раскрытие автора (?expand=created_by)
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    query_budget = 10
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
+    filterset_class = ProductFilter
 
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['name']
 
+    def list(self, request, *args, **kwargs):
+        """ETag по штампу отфильтрованной выборки; при совпадении 304 без чтения строк"""
+        queryset = self.filter_queryset(self.get_queryset())
+        # Фасеты считаются и по строкам вне фильтров, тогда штамп берётся по всему каталогу
+        stamped = self.get_queryset() if request.query_params.get('facets') else queryset
+        validators = queryset_validators(stamped, request.get_full_path())
+        return conditional_response(request, validators, lambda: self.list_response(request, queryset))
+
+    def list_response(self, request, queryset):
+        """Чтение идёт мимо ModelSerializer: values_list() и готовая функция строка -> dict"""
+        reader = FastProductSerializer.from_request(request)
+        rows = reader.values(queryset)
+        facets = self.get_facets()
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            response = self.get_paginated_response(reader.serialize(page))
+        else:
+            response = Response(reader.serialize(rows))
+
+        if facets is not None:
+            if page is None:
+                response.data = {'results': response.data}
+            response.data['facets'] = facets
+        return response
+
+    def get_facets(self):
+        """Счётчики групп из ?facets; поиск учитывается, фильтры группы - нет"""
+        param = self.request.query_params.get('facets')
+        if not param:
+            return None
+
+        groups = [name.strip() for name in param.split(',') if name.strip()]
+        unknown = [name for name in groups if name not in FACETS]
+        if unknown:
+            raise ValidationError({'facets': f"Неизвестные группы: {', '.join(unknown)}"})
+
+        queryset = self.get_queryset()
+        query = self.request.query_params.get(ProductSearchFilter.search_param, '').strip()
+        if query:
+            queryset = search_products(queryset, query, rank=False)
+        return product_facets(self.request.query_params, queryset, groups)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            # Как get_object_or_404 в DRF: id не того типа - 404, а не 500
+            raise NotFound()
+        etag, last_modified = queryset_validators(queryset, request.get_full_path())
+        if last_modified is None:
+            etag = None
+        return conditional_response(request, (etag, last_modified), lambda: self.retrieve_response(request, queryset))
+
+    def retrieve_response(self, request, queryset):
+        reader = FastProductSerializer.from_request(request)
+        rows = reader.serialize(reader.values(queryset)[:1])
+        if not rows:
+            raise NotFound()
+        return Response(rows[0])
+
 
 @extend_schema_view(
     list=extend_schema(
         summary="Получить список заказов",
-        description="Возвращает список всех заказов с возможностью фильтрации и сортировки"
+        description="Возвращает список всех заказов с возможностью фильтрации и сортировки",
+        parameters=[
+            OpenApiParameter(
+                'pagination',
+                str,
+                enum=['cursor', 'nocount'],
+                description="cursor - курсор по (created_at, id), nocount - страницы без COUNT(*)",
+            ),
+        ],
     ),
     create=extend_schema(
         summary="Создать новый заказ",
@@ -79,13 +178,34 @@ class OrderViewSet(viewsets.ModelViewSet):
     ViewSet для работы с заказами.
 
     Поддерживает:
-    - Фильтрацию по пользователю, промокоду и дате создания
-    - Сортировку по дате создания и пользователю
+    - Фильтрацию по пользователю, промокоду, дате создания и сумме
+    - Сортировку по дате создания, пользователю и сумме
+    - Курсорную пагинацию (?pagination=cursor) и страницы без COUNT(*) (?pagination=nocount)
     """
-    queryset = Order.objects.all()
+    queryset = Order.objects.prefetch_related(
+        Prefetch('products', queryset=Product.objects.only('id').order_by('pk'))
+    )
     serializer_class = OrderSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    pagination_classes = {
+        'cursor': OrderCursorPagination,
+        'nocount': NoCountPageNumberPagination,
+    }
+
+    filterset_fields = {
+        'user': ['exact'],
+        'promocode': ['exact'],
+        'created_at': ['exact'],
+        'total': ['exact', 'gte', 'lte'],
+    }
+    ordering_fields = ['created_at', 'user', 'total']
+    ordering = ['-created_at', '-id']
 
-    filterset_fields = ['user', 'promocode', 'created_at']
-    ordering_fields = ['created_at', 'user']
-    ordering = ['-created_at']
\ No newline at end of file
+    @property
+    def paginator(self):
+        """?pagination=cursor или ?pagination=nocount выбирает режим без COUNT(*)"""
+        if not hasattr(self, '_paginator'):
+            mode = self.request.query_params.get('pagination') if self.request else None
+            pagination_class = self.pagination_classes.get(mode, self.pagination_class)
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
\ No newline at end of file